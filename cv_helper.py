@@ -1,14 +1,25 @@
 import cv2
+import concurrent.futures
+import contextlib
+import functools
+import json
 from contextlib import contextmanager
+from dataclasses import dataclass
 from imutils.video import FPS
 from icecream import ic
 import os
+import sys
+import multiprocessing
+import shutil
+import subprocess
+import tempfile
 import typer
 import numpy as np
 from PIL import Image
 from typing_extensions import Protocol
 import threading
 import queue
+import time
 
 
 def cv2_video(path):
@@ -19,6 +30,14 @@ def cv2_video(path):
     return input_video
 
 
+def atomic_write_json(path, data):
+    # Write then rename, so a crash never leaves a half written file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
 # Make a context manager (since it's familiar)
 # interface create(input_video),release(), frame(i,frame)
 @contextmanager
@@ -40,14 +59,42 @@ class FrameProcessor(Protocol):
     def frame(self, idx: int, frame) -> None:
         pass
 
+    # Optional, a processor that only looks at some frames can declare either
+    # (both read after create()):
+    #   frame_stride: int - only frames where idx % frame_stride == 0
+    #   wants_frame(idx) -> bool - only frames it returns True for
+    # Other frames are skipped without being decoded to BGR, and frame() is
+    # never called for them.
+
+
+def frame_selector(frame_processor):
+    """Return (stride, wants_frame) declared by frame_processor"""
+    stride = max(1, int(getattr(frame_processor, "frame_stride", 1)))
+    wants_frame = getattr(frame_processor, "wants_frame", None)
+    return stride, wants_frame
+
 
-def process_video(input_video, frame_processor: FrameProcessor):
+@dataclass
+class ProcessStats:
+    frames: int
+    elapsed: float
+
+
+def process_video(
+    input_video,
+    frame_processor: FrameProcessor,
+    prefetch: int = 8,
+    seek: bool = False,
+) -> ProcessStats:
     width = input_video.get(cv2.CAP_PROP_FRAME_WIDTH)  # float `width`
     height = input_video.get(cv2.CAP_PROP_FRAME_HEIGHT)  # float `height`
     video_fps = input_video.get(cv2.CAP_PROP_FPS)
     frame_count = int(input_video.get(cv2.CAP_PROP_FRAME_COUNT))
     ic(width, height, video_fps, frame_count)
 
+    progress_shown = 0
+    frames_processed = 0
+
     # start the FPS timer
     fps = FPS().start()
     with (
@@ -55,38 +102,171 @@ def process_video(input_video, frame_processor: FrameProcessor):
         process_video_frames_context_manager(
             frame_processor, input_video
         ) as process_frame,
+        # PERF: Decode on a background thread so decoding frame N+1 overlaps
+        # frame_processor.frame(N). prefetch=0 decodes inline like before.
+        contextlib.closing(
+            PrefetchingVideoReader(
+                input_video, prefetch, *frame_selector(frame_processor), seek
+            )
+            if prefetch > 0
+            else video_reader(input_video, *frame_selector(frame_processor), seek)
+        ) as reader,
     ):
-        for i, frame in enumerate(video_reader(input_video)):
+        for i, frame in reader:
             # Update UX counters
             fps.update()
+            frames_processed += 1
             process_frame.frame(i, frame)
-            if (i % int(frame_count / 100)) == 0:
-                progress_bar.update(1)
+            progress = min(100, int(100 * (i + 1) / max(1, frame_count)))
+            if progress > progress_shown:
+                progress_bar.update(progress - progress_shown)
+                progress_shown = progress
 
     # stop the timer and display FPS information
     fps.stop()
     ic(int(fps.fps()), "Elapsed Seconds", int(fps.elapsed()))
+    if isinstance(reader, PrefetchingVideoReader):
+        # decode_seconds is what decoding cost, waiting_seconds is the part of
+        # it the processor still had to wait for, the difference ran overlapped.
+        ic(
+            "Decode Seconds",
+            round(reader.decode_seconds, 1),
+            "Waiting On Decode Seconds",
+            round(reader.waiting_seconds, 1),
+            "Overlapped Seconds",
+            round(reader.decode_seconds - reader.waiting_seconds, 1),
+        )
+    return ProcessStats(frames=frames_processed, elapsed=fps.elapsed())
 
 
-def video_reader(input_video):
+def video_reader(input_video, stride: int = 1, wants_frame=None, seek: bool = False):
+    """
+    Yield (idx, frame) for the frames selected by stride and wants_frame.
+
+    PERF: Skipped frames are grab()'d but never retrieve()'d, so they skip the
+    BGR conversion. With seek, a stride jumps straight to the next wanted frame
+    (the decoder restarts at the preceding keyframe), which wins when the
+    stride is longer than a GOP.
+    """
+    idx = int(input_video.get(cv2.CAP_PROP_POS_FRAMES))
     while True:
+        wanted = idx % stride == 0 and (wants_frame is None or wants_frame(idx))
+        if not wanted:
+            if not input_video.grab():
+                return
+            idx += 1
+            continue
+
         ret, frame = input_video.read()
         if not ret:
             return
-        yield frame
+        yield idx, frame
+        idx += 1
+        if seek and stride > 1:
+            idx += stride - 1
+            input_video.set(cv2.CAP_PROP_POS_FRAMES, idx)
+
+
+class PrefetchingVideoReader:
+    """
+    Iterate (idx, frame) of input_video, decoded ahead on a background thread.
+
+    At most queue_depth decoded frames are held in memory. Call close() (or
+    use contextlib.closing) to stop the decode thread on error or early exit.
+    """
+
+    _end_of_video = object()
+
+    def __init__(
+        self,
+        input_video,
+        queue_depth: int = 8,
+        stride: int = 1,
+        wants_frame=None,
+        seek: bool = False,
+    ):
+        self.frames = video_reader(input_video, stride, wants_frame, seek)
+        self.frame_queue = queue.Queue(maxsize=queue_depth)
+        self.stop_event = threading.Event()
+        self.decode_seconds = 0.0
+        self.waiting_seconds = 0.0
+        self.decode_thread = threading.Thread(target=self.decode, daemon=True)
+        self.decode_thread.start()
+
+    def decode(self):
+        try:
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                item = next(self.frames, self._end_of_video)
+                self.decode_seconds += time.perf_counter() - start
+                if item is self._end_of_video:
+                    break
+                self.put(item)
+            self.put(self._end_of_video)
+        except Exception as e:  # noqa: BLE001
+            # Hand the error to the consumer so it surfaces on the main thread
+            self.put(e)
+
+    def put(self, item):
+        # Don't block forever on a full queue if the consumer went away
+        while not self.stop_event.is_set():
+            try:
+                self.frame_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.stop_event.is_set():
+            raise StopIteration
+        start = time.perf_counter()
+        item = self.frame_queue.get()
+        self.waiting_seconds += time.perf_counter() - start
+        if item is self._end_of_video:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        return item
+
+    def close(self):
+        self.stop_event.set()
+        # Drain so a decode thread blocked on put() can notice the stop
+        while True:
+            try:
+                self.frame_queue.get_nowait()
+            except queue.Empty:
+                break
+        self.decode_thread.join()
 
 
 class LazyVideoWriter:
-    def __init__(self, name: str, fps: int):
+    # policy when the encoder falls behind and the queue is full:
+    #   block - write() waits for room (no frames lost, memory stays flat)
+    #   drop  - write() discards the frame and counts it in frames_dropped
+    BLOCK = "block"
+    DROP = "drop"
+
+    _stop = object()
+
+    def __init__(self, name: str, fps: int, max_queue: int = 32, policy=BLOCK):
+        assert policy in (self.BLOCK, self.DROP), f"Unknown policy {policy}"
         self.name = name
         self.height, self.width = 0, 0
         self.vw = None
         self.fps = fps
-        self.frame_queue = queue.Queue()
-        self.frame_available = (
-            threading.Event()
-        )  # Event to signal when a frame is added
-        self.stop_thread = False
+        self.policy = policy
+        self.frame_queue = queue.Queue(maxsize=max_queue)
+        # Counters, reported on release()
+        self.queue_high_water_mark = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.encode_seconds = 0.0
+        self.error = None
         self.write_thread = threading.Thread(target=self.process_queue)
         self.write_thread.start()
 
@@ -98,36 +278,335 @@ class LazyVideoWriter:
         )
 
     def write(self, frame):
-        self.frame_queue.put(frame)
-        self.frame_available.set()  # Signal that a new frame is available
+        if self.policy == self.DROP:
+            try:
+                self.frame_queue.put_nowait(frame)
+            except queue.Full:
+                self.frames_dropped += 1
+                return
+        else:
+            self.frame_queue.put(frame)
+        self.queue_high_water_mark = max(
+            self.queue_high_water_mark, self.frame_queue.qsize()
+        )
 
     def process_queue(self):
-        while not self.stop_thread or not self.frame_queue.empty():
-            self.frame_available.wait()  # Wait for a frame to become available
-            if not self.frame_queue.empty():
-                frame = self.frame_queue.get()
-                if self.vw is None:
-                    self.create(frame)
-                width, height = int(frame.shape[1]), int(frame.shape[0])
-                assert width == self.width and height == self.height, (
-                    "Frame dimensions do not match."
-                )
-                self.vw.write(frame)
-                if self.frame_queue.empty():
-                    self.frame_available.clear()  # Reset the event if no more frames are available
+        while True:
+            frame = self.frame_queue.get()  # Blocks until a frame is available
+            if frame is self._stop:
+                return
+            if self.error:
+                # Keep draining so a blocked write() can't hang the producer
+                continue
+            try:
+                self.encode(frame)
+            except Exception as e:  # noqa: BLE001
+                # release() raises it on the caller's thread
+                self.error = e
+
+    def encode(self, frame):
+        if self.vw is None:
+            self.create(frame)
+        width, height = int(frame.shape[1]), int(frame.shape[0])
+        assert width == self.width and height == self.height, (
+            "Frame dimensions do not match."
+        )
+        start = time.perf_counter()
+        self.vw.write(frame)
+        self.encode_seconds += time.perf_counter() - start
+        self.frames_written += 1
 
     def release(self):
-        self.stop_thread = True
-        self.frame_available.set()  # Ensure the thread wakes up to process the stop signal
+        # Always block on the stop marker, it must not be dropped
+        self.frame_queue.put(self._stop)
         self.write_thread.join()
         if self.vw:
             self.vw.release()
+        encode_ms_per_frame = round(
+            1000 * self.encode_seconds / max(1, self.frames_written), 2
+        )
+        ic(
+            self.name,
+            self.frames_written,
+            self.frames_dropped,
+            self.queue_high_water_mark,
+            encode_ms_per_frame,
+        )
+        if self.error:
+            raise self.error
 
 
 # Use a lazy video writer so don't have to pass in an
 # height/width, can read from first frame.
 
 
+@dataclass
+class Shard:
+    index: int
+    start: int  # first frame handed to frame()
+    end: int | None  # one past the last frame handed to frame(), None to the end
+    warmup_start: int  # frames [warmup_start, start) go to warmup() only
+
+
+def split_into_shards(frame_count: int, shards: int, warmup_frames: int = 0):
+    shards = max(1, min(shards, frame_count))
+    bounds = np.linspace(0, frame_count, shards + 1).astype(int).tolist()
+    # CAP_PROP_FRAME_COUNT is only an estimate for a lot of containers, so
+    # the last shard runs to whatever the real end is
+    ends = bounds[1:-1] + [None]
+    return [
+        Shard(i, start, end, max(0, start - warmup_frames))
+        for i, (start, end) in enumerate(zip(bounds[:-1], ends))
+    ]
+
+
+def limit_worker_threads():
+    """
+    Pool initializer: the pool is the parallelism, so each worker gets one
+    thread for OpenCV, and for OpenMP/BLAS in whatever it imports later
+    (torch reads OMP_NUM_THREADS when it's imported, which in a spawned
+    worker is when the first task is unpickled)
+    """
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = "1"
+    cv2.setNumThreads(1)
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(1)
+
+
+def process_pool(max_workers: int):
+    """ProcessPoolExecutor for video work, one thread per worker"""
+    # spawn, not fork - cv2 and the writer threads don't survive a fork
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=limit_worker_threads,
+    )
+
+
+def process_video_shard(video_path: str, processor_factory, shard: Shard):
+    """
+    Run one shard in this process: seek to the shard, prime the processor on
+    the warm-up frames, then process [start, end). Returns the processor's
+    shard_result() if it has one.
+    """
+    input_video = cv2_video(video_path)
+    input_video.set(cv2.CAP_PROP_POS_FRAMES, shard.warmup_start)
+    frame_processor = processor_factory(shard)
+    with process_video_frames_context_manager(
+        frame_processor, input_video
+    ) as process_frame:
+        warmup = getattr(process_frame, "warmup", None)
+        frames = video_reader(input_video, *frame_selector(process_frame))
+        for idx, frame in frames:
+            if shard.end is not None and idx >= shard.end:
+                break
+            if idx >= shard.start:
+                process_frame.frame(idx, frame)
+            elif warmup:
+                warmup(idx, frame)
+    input_video.release()
+    shard_result = getattr(frame_processor, "shard_result", None)
+    return shard_result() if shard_result else None
+
+
+def process_video_sharded(
+    video_path: str, processor_factory, shards: int = 0, warmup_frames: int = 0
+):
+    """
+    Split video_path into time ranges and process each in its own process.
+
+    processor_factory(shard) must be picklable (e.g. a module level function
+    or functools.partial) and return a FrameProcessor, which should write to
+    per-shard outputs. shards=0 uses one shard per core. Returns the shard
+    results in shard order, so the caller can join them.
+    """
+    input_video = cv2_video(video_path)
+    frame_count = int(input_video.get(cv2.CAP_PROP_FRAME_COUNT))
+    input_video.release()
+
+    shard_list = split_into_shards(frame_count, shards or os.cpu_count(), warmup_frames)
+    ic(video_path, frame_count, len(shard_list), warmup_frames)
+
+    start = time.perf_counter()
+    with process_pool(len(shard_list)) as pool:
+        futures = [
+            pool.submit(process_video_shard, video_path, processor_factory, shard)
+            for shard in shard_list
+        ]
+        results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+    ic(int(frame_count / max(elapsed, 1e-6)), "Elapsed Seconds", int(elapsed))
+    return results
+
+
+def concat_videos(
+    segment_paths, output_path: str, fps: float, cleanup=True, codec_tag=None
+):
+    """
+    Join video segments in order into output_path. Segments that were never
+    written (e.g. a shard with no motion) are skipped. codec_tag sets the
+    output's sample entry, e.g. avc3 when parameter sets are in-band.
+    """
+    segment_paths = [p for p in segment_paths if os.path.exists(p)]
+    if not segment_paths:
+        return
+    if shutil.which("ffmpeg"):
+        # PERF: Segments share a codec, so join them with a stream copy
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            for p in segment_paths:
+                f.write(f"file '{os.path.abspath(p)}'\n")
+            list_file = f.name
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0"]
+            + ["-i", list_file, "-c", "copy"]
+            + (["-tag:v", codec_tag] if codec_tag else [])
+            + [output_path],
+            check=True,
+        )
+        os.remove(list_file)
+    else:
+        writer = LazyVideoWriter(output_path, fps)
+        for p in segment_paths:
+            segment = cv2_video(p)
+            for _, frame in video_reader(segment):
+                writer.write(frame)
+            segment.release()
+        writer.release()
+
+    if cleanup:
+        for p in segment_paths:
+            os.remove(p)
+
+
+def require_ffmpeg():
+    for tool in ["ffmpeg", "ffprobe"]:
+        if not shutil.which(tool):
+            raise FileNotFoundError(f"{tool} not found on PATH, needed for stream copy")
+
+
+def ffprobe_video(video_path: str, entries: str, extra_args=()):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "v:0", *extra_args]
+        + ["-show_entries", entries, "-of", "csv=p=0", video_path],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return [line.split(",") for line in result.stdout.split()]
+
+
+def keyframe_times(video_path: str) -> list[float]:
+    # Reads packet headers only, nothing is decoded
+    packets = ffprobe_video(video_path, "packet=pts_time,flags")
+    return sorted(
+        float(pts) for pts, flags, *_ in packets if "K" in flags and pts != "N/A"
+    )
+
+
+@dataclass
+class EdgeCodec:
+    """
+    How to re-encode the edges so they join the copied middle. The edges
+    have their own SPS/PPS (VPS too for hevc) and a joined MP4 only keeps
+    the first part's out of band, so every part carries its parameter sets
+    in front of its keyframes (the encoder repeats them, copied parts go
+    through the Annex-B filter) and the output is tagged for in-band ones.
+    """
+
+    encoder_args: list[str]
+    annexb_filter: str
+    in_band_tag: str
+
+
+edge_codecs = {
+    "h264": EdgeCodec(
+        ["-c:v", "libx264", "-x264-params", "repeat-headers=1"],
+        "h264_mp4toannexb",
+        "avc3",
+    ),
+    "hevc": EdgeCodec(
+        ["-c:v", "libx265", "-x265-params", "repeat-headers=1"],
+        "hevc_mp4toannexb",
+        "hev1",
+    ),
+}
+
+
+def ffmpeg_segment(video_path, start, frames, output_path, codec_args=("-c", "copy")):
+    # Count frames rather than seconds, so rounding can't add or drop one
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-ss", f"{start:.6f}"]
+        + ["-i", video_path, "-frames:v", str(frames), "-map", "0:v:0", "-an"]
+        + list(codec_args)
+        + ["-avoid_negative_ts", "make_zero", output_path],
+        check=True,
+    )
+
+
+def cut_stream_copy(
+    video_path: str,
+    intervals_seconds: list[tuple[float, float]],
+    output_path: str,
+    reencode_edges: bool = False,
+):
+    """
+    Write the [start, end) second intervals of video_path to output_path.
+
+    PERF: Whole GOPs inside an interval are packet copied, so most of the
+    output costs only I/O. By default the cut snaps out to the keyframe
+    before start and everything is copied. With reencode_edges (h264 and
+    hevc only) the partial GOPs at the edges are re-encoded with the source
+    codec for an exact cut, and the output has in-band parameter sets
+    (avc3/hev1). Video only, like LazyVideoWriter output.
+    """
+    require_ffmpeg()
+    keyframes = keyframe_times(video_path)
+    (codec, pix_fmt, rate) = ffprobe_video(
+        video_path, "stream=codec_name,pix_fmt,avg_frame_rate"
+    )[0]
+    if reencode_edges and codec not in edge_codecs:
+        ic(f"Can't re-encode {codec} edges, snapping to keyframes")
+        reencode_edges = False
+    num, _, den = rate.partition("/")
+    fps = float(num) / float(den or 1)
+
+    copy_args = ["-c", "copy"]
+    codec_tag = None
+    if reencode_edges:
+        edge = edge_codecs[codec]
+        copy_args += ["-bsf:v", edge.annexb_filter]
+        encode_args = edge.encoder_args + ["-pix_fmt", pix_fmt]
+        codec_tag = edge.in_band_tag
+
+    segment_paths = []
+
+    def segment(start, end, encode=False):
+        frames = round((end - start) * fps)
+        if frames <= 0:
+            return
+        path = f"{output_path}.part{len(segment_paths):04d}.mp4"
+        codec_args = encode_args if encode else copy_args
+        ffmpeg_segment(video_path, start, frames, path, codec_args)
+        segment_paths.append(path)
+
+    for start, end in intervals_seconds:
+        if not reencode_edges:
+            snapped = max([k for k in keyframes if k <= start], default=0.0)
+            segment(snapped, end)
+            continue
+        inner = [k for k in keyframes if start <= k <= end]
+        if len(inner) < 2:
+            # No whole GOP inside the interval, re-encode all of it
+            segment(start, end, encode=True)
+            continue
+        segment(start, inner[0], encode=True)
+        segment(inner[0], inner[-1])
+        segment(inner[-1], end, encode=True)
+
+    concat_videos(segment_paths, output_path, fps, codec_tag=codec_tag)
+
+
 def PIL_to_open_cv(pil_img):
     as_cv = np.asarray(pil_img)  # I nee to change color spaces
     cv_fix_color = cv2.cvtColor(as_cv, cv2.COLOR_RGB2BGR)
@@ -141,9 +620,68 @@ def open_cv_to_PIL(frame):
     return img_pil
 
 
+@functools.lru_cache(maxsize=1024)
+def text_sprite(line, font_scale):
+    """
+    A line of white anti-aliased text, rasterized once and cropped to the
+    pixels it touches: (text, alpha, offset of its top left from the putText
+    origin), or None if it's blank.
+    """
+    (width, height), baseline = cv2.getTextSize(
+        line, cv2.FONT_HERSHEY_SIMPLEX, font_scale, 2
+    )
+    pad = 8  # thickness and anti-aliasing spill past getTextSize
+    canvas = np.zeros((height + baseline + 2 * pad, width + 2 * pad), np.uint8)
+    cv2.putText(
+        canvas,
+        line,
+        (pad, pad + height),
+        cv2.FONT_HERSHEY_SIMPLEX,
+        font_scale,
+        255,
+        2,
+        cv2.LINE_AA,
+    )
+    ys, xs = np.nonzero(canvas)
+    if len(ys) == 0:
+        return None
+    canvas = canvas[ys.min() : ys.max() + 1, xs.min() : xs.max() + 1]
+    text = cv2.merge([canvas, canvas, canvas])
+    alpha = canvas.astype(np.float32) / 255
+    return text, alpha, (xs.min() - pad, ys.min() - pad - height)
+
+
+def blend_text_sprite(image, sprite, origin, box):
+    """
+    White text over image, same pixels as putText's LINE_AA. Where it's all
+    on the (inclusive) black box, that's just the max of the two.
+    """
+    if sprite is None:
+        return
+    text, alpha, (dx, dy) = sprite
+    left, top = origin[0] + dx, origin[1] + dy
+    right, bottom = left + text.shape[1], top + text.shape[0]
+    (box_left, box_top), (box_right, box_bottom) = box
+    x0, y0 = max(left, 0), max(top, 0)
+    x1, y1 = min(right, image.shape[1]), min(bottom, image.shape[0])
+    if x0 >= x1 or y0 >= y1:
+        return
+    region = image[y0:y1, x0:x1]
+    text = text[y0 - top : y1 - top, x0 - left : x1 - left]
+    if (
+        box_left <= x0
+        and x1 <= box_right + 1
+        and box_top <= y0
+        and y1 <= box_bottom + 1
+    ):
+        cv2.max(region, text, dst=region)
+        return
+    a = alpha[y0 - top : y1 - top, x0 - left : x1 - left]
+    region[:] = cv2.blendLinear(region, np.full_like(text, 255), 1 - a, a)
+
+
 def write_text(image, text, origin, font_scale=1.0):
     # TODO, shift fonts if canvas is small
-    color_white = (255, 255, 255)
     color_black = (0, 0, 0)
     x, y = origin
 
@@ -170,17 +708,12 @@ def write_text(image, text, origin, font_scale=1.0):
         -1,
     )
 
+    # PERF: the stats box and body part labels are mostly the same lines
+    # every frame, so blend cached sprites rather than putText each line
+    box = (rect_top_left, rect_bottom_right)
     for line in text.split("\n"):
-        image = cv2.putText(
-            image,
-            line,
-            (int(x), int(y)),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            font_scale,
-            color_white,
-            2,
-            cv2.LINE_AA,
-        )
+        sprite = text_sprite(line, font_scale)
+        blend_text_sprite(image, sprite, (int(x), int(y)), box)
         y += font_height * font_scale
     return image
 
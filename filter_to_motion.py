@@ -23,6 +23,12 @@
 # 1 pass build the masks
 # 2 clean up things we can detect inter frame
 # E.g. 10s motion -> 2s no_motion -> 10s motion, should assume motion in between
+#
+# TrimMotion does this:
+# 1 MotionScorer - score only the analysis frames, at reduced resolution
+# 2 motion_intervals - fill short gaps, pad each interval, saved to _intervals.json
+# 3 IntervalWriter - write the kept intervals, no re-analysis
+# Changing padding or gap thresholds re-uses the saved _motion.npy index.
 
 
 import cv_helper
@@ -32,12 +38,15 @@ import numpy as np
 from dataclasses import dataclass
 import typer
 import os.path
+import functools
+import concurrent.futures
+import glob
+import json
+import time
+import bisect
 
 app = typer.Typer()
 
-backSub = cv2.createBackgroundSubtractorMOG2(history=120)
-# backSub = cv2.createBackgroundSubtractorKNN()
-
 # Some globals
 color_black = 0
 color_white = 255
@@ -55,6 +64,7 @@ class FrameState:
 # TBD compute this.
 
 analysis_key_frame_rate = 10
+background_history = 120
 
 
 def obsolete_handled_by_bg_remover_remove_ring_timestamp(frame):
@@ -91,15 +101,17 @@ def square_kernel(side):
     return np.ones((side, side), np.uint8)
 
 
-def to_contours(frame):
+def to_contours(
+    frame, erode_size=10, dilate_size=40, fill_size=200, min_contour_area=100
+):
 
     frame = to_black_and_white(frame)
 
     # Remove artifact noise, 10x10 seems like plenty
-    frame = cv2.erode(frame, square_kernel(10))
+    frame = cv2.erode(frame, square_kernel(erode_size))
 
     # Without noise, can dialate (fill in) with a decent kernel size.
-    frame = cv2.dilate(frame, square_kernel(40))
+    frame = cv2.dilate(frame, square_kernel(dilate_size))
 
     contouring_method = cv2.RETR_EXTERNAL  # Only outer edges
     # contouring_method =  cv2.RETR_CCOMP # 2 level outer, then inner
@@ -113,22 +125,68 @@ def to_contours(frame):
     draw_all_counters = -1
     contour_color = color_grey  # Black
     contour_thickness_fill = -1
-    good_contours = [c for c in contours if cv2.contourArea(c) > 100]
+    good_contours = [c for c in contours if cv2.contourArea(c) > min_contour_area]
     frame = cv2.drawContours(
         frame, good_contours, draw_all_counters, contour_color, contour_thickness_fill
     )
 
     # Dialate again to try and fill holes
-    dialate_kernel = square_kernel(200)
+    dialate_kernel = square_kernel(fill_size)
     frame = cv2.dilate(frame, dialate_kernel)
 
     return frame
 
 
-def to_motion_mask(frame):
-    motion_mask = backSub.apply(frame)
-    motion_mask = to_contours(motion_mask)
-    return motion_mask
+def max_pool(frame, factor):
+    # Shrink keeping any white pixel white, so nothing thin is lost. For a
+    # binary mask a block's area average is non zero iff any pixel is white.
+    h, w = frame.shape[:2]
+    pad_h, pad_w = -h % factor, -w % factor
+    frame = cv2.copyMakeBorder(frame, 0, pad_h, 0, pad_w, cv2.BORDER_CONSTANT, 0)
+    dsize = (frame.shape[1] // factor, frame.shape[0] // factor)
+    pooled = cv2.resize(frame, dsize, interpolation=cv2.INTER_AREA)
+    return np.where(pooled > 0, np.uint8(color_white), np.uint8(color_black))
+
+
+def to_contours_fast(
+    frame,
+    erode_size=10,
+    dilate_size=40,
+    fill_size=200,
+    min_contour_area=100,
+    proxy_scale=4,
+):
+    """
+    to_contours on a proxy mask proxy_scale times smaller.
+
+    PERF: The threshold and the small erode stay at full size (the erode is
+    what removes noise), then everything after, including the 200x200 fill
+    dilate that dominates to_contours, runs on a max-pooled proxy with the
+    kernels and contour area scaled down. Edges land within 2 * proxy_scale
+    pixels of to_contours (each dilate can be off by up to proxy_scale - 1),
+    check with CheckContours.
+    """
+    if proxy_scale <= 1:
+        return to_contours(frame, erode_size, dilate_size, fill_size, min_contour_area)
+
+    h, w = frame.shape[:2]
+    frame = to_black_and_white(frame)
+    frame = cv2.erode(frame, square_kernel(erode_size))
+
+    proxy = max_pool(frame, proxy_scale)
+    proxy = cv2.dilate(proxy, square_kernel(max(1, dilate_size // proxy_scale)))
+    contours, _ = cv2.findContours(proxy, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    proxy_min_area = min_contour_area / (proxy_scale * proxy_scale)
+    good_contours = [c for c in contours if cv2.contourArea(c) > proxy_min_area]
+    proxy = cv2.drawContours(proxy, good_contours, -1, color_grey, -1)
+    proxy = cv2.dilate(proxy, square_kernel(max(1, fill_size // proxy_scale)))
+
+    full = cv2.resize(
+        proxy,
+        (proxy.shape[1] * proxy_scale, proxy.shape[0] * proxy_scale),
+        interpolation=cv2.INTER_NEAREST,
+    )
+    return full[:h, :w]
 
 
 def create_analyze_debug_frame(frame, motion_mask):
@@ -149,23 +207,70 @@ def to_blur(f):
     return cv2.blur(f, (20, 20))
 
 
-def to_motion_mask_fast(state: FrameState, frame):
+class MotionAnalyzer:
+    # Owns the background model and analysis parameters, so each video (or
+    # shard) gets its own model and several can run in one process without
+    # contaminating each other.
+    def __init__(
+        self,
+        history=background_history,
+        key_frame_rate=analysis_key_frame_rate,
+        erode_size=10,
+        dilate_size=40,
+        fill_size=200,
+        min_contour_area=100,
+        proxy_scale=1,
+    ):
+        self.history = history
+        self.key_frame_rate = key_frame_rate
+        self.erode_size = erode_size
+        self.dilate_size = dilate_size
+        self.fill_size = fill_size
+        self.min_contour_area = min_contour_area
+        # > 1 uses to_contours_fast, which runs on a proxy this many times smaller
+        self.proxy_scale = proxy_scale
+        self.backSub = cv2.createBackgroundSubtractorMOG2(history=history)
+        # self.backSub = cv2.createBackgroundSubtractorKNN()
+        self.state = FrameState(0, None)
+        # motion_index_dtype stats of the last analysed mask
+        self.last_stats = (0.0, 0.0)
+
+    def to_contours(self, frame):
+        return to_contours_fast(
+            frame,
+            self.erode_size,
+            self.dilate_size,
+            self.fill_size,
+            self.min_contour_area,
+            self.proxy_scale,
+        )
 
-    # Function is fast because analysis is sampled
+    def to_motion_mask(self, frame):
+        motion_mask = self.backSub.apply(frame)
+        motion_mask = self.to_contours(motion_mask)
+        return motion_mask
 
-    is_first_frame = state.idx < 2
-    is_analysis_frame = state.idx % analysis_key_frame_rate == 0
-    is_do_analyze = is_analysis_frame or is_first_frame
+    def to_motion_mask_fast(self, idx, frame):
 
-    if not is_do_analyze:
-        return state.last_fg_mask
+        # Function is fast because analysis is sampled
+        state = self.state
+        state.idx = idx
 
-    fast_transforms = [to_grayscale]
-    for t in fast_transforms:
-        frame = t(frame)
+        # A shard starts mid video, so "first" is also the first frame we've seen
+        is_first_frame = state.idx < 2 or state.last_fg_mask is None
+        is_analysis_frame = state.idx % self.key_frame_rate == 0
+        is_do_analyze = is_analysis_frame or is_first_frame
 
-    state.last_fg_mask = to_motion_mask(frame)
-    return state.last_fg_mask
+        if not is_do_analyze:
+            return state.last_fg_mask
+
+        fast_transforms = [to_grayscale]
+        for t in fast_transforms:
+            frame = t(frame)
+
+        state.last_fg_mask = self.to_motion_mask(frame)
+        self.last_stats = motion_stats(state.last_fg_mask)
+        return state.last_fg_mask
 
 
 def shrink_image_half(src):
@@ -193,9 +298,11 @@ def burn_in_debug_info(frame, idx, in_fps):
     )
 
 
+# Even mostly black images have some noise, set a threshold
+percent_image_non_zero_still_black = 0.1
+
+
 def is_frame_black(frame):
-    # Even mostly black images have some noise, set a threshold
-    percent_image_non_zero_still_black = 0.1
     total_pixels = frame.shape[0] * frame.shape[1]
     non_zero_pixels_in_black_image = int(
         0.01 * percent_image_non_zero_still_black * total_pixels
@@ -204,14 +311,65 @@ def is_frame_black(frame):
     return count_non_zero < non_zero_pixels_in_black_image
 
 
+def non_zero_fraction(frame):
+    return np.count_nonzero(frame) / (frame.shape[0] * frame.shape[1])
+
+
+# Per-frame motion index, saved next to the video as <base>_motion.npy so
+# threshold tuning, thumbnails and trimming don't need to decode it again.
+# Both are fractions of the frame so they don't depend on analysis size.
+motion_index_dtype = np.dtype(
+    [("nonzero_fraction", np.float32), ("largest_contour_area", np.float32)]
+)
+
+
+def motion_stats(motion_mask):
+    contours, _ = cv2.findContours(
+        motion_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    largest = max((cv2.contourArea(c) for c in contours), default=0.0)
+    total_pixels = motion_mask.shape[0] * motion_mask.shape[1]
+    return non_zero_fraction(motion_mask), largest / total_pixels
+
+
+def new_motion_index(frame_count):
+    # NaN marks frames not analysed (yet), e.g. other shards' frames
+    return np.full(frame_count, np.nan, motion_index_dtype)
+
+
+def motion_index_filename(base_filename):
+    return f"{base_filename}_motion.npy"
+
+
+def save_motion_index(base_filename, index):
+    np.save(motion_index_filename(base_filename), index)
+
+
+def load_motion_index(base_filename):
+    # Memory mapped, readers only page in the frames they look at
+    path = motion_index_filename(base_filename)
+    if not os.path.exists(path):
+        return None
+    return np.load(path, mmap_mode="r")
+
+
+def join_motion_indexes(indexes):
+    joined = np.array(indexes[0])
+    for index in indexes[1:]:
+        missing = np.isnan(joined["nonzero_fraction"])
+        joined[missing] = index[missing]
+    return joined
+
+
 class remove_background:
-    def __init__(self, base_filename):
+    def __init__(self, base_filename, **motion_params):
         self.base_filename = base_filename
-        pass
+        # Passed to MotionAnalyzer, e.g. history, key_frame_rate, fill_size
+        self.motion_params = motion_params
 
     def create(self, input_video):
         self.video = input_video
-        self.state = FrameState(0, 0)
+        self.analyzer = MotionAnalyzer(**self.motion_params)
         self.in_fps = input_video.get(cv2.CAP_PROP_FPS)
         self.debug_window_refresh_rate = int(
             self.in_fps / 2
@@ -225,20 +383,36 @@ class remove_background:
             self.mask_filename, self.in_fps
         )
         self.output_video_files = [self.output_unique, self.output_unique_mask]
+        self.motion_index = new_motion_index(
+            int(input_video.get(cv2.CAP_PROP_FRAME_COUNT))
+        )
 
     def destroy(self):
         cv2.destroyAllWindows()
         for f in self.output_video_files:
             f.release()
+        save_motion_index(self.base_filename, self.motion_index)
+
+    def warmup(self, idx, original_frame):
+        # Sharded runs: prime the background model on the frames before the
+        # shard without writing anything.
+        self.analyzer.to_motion_mask_fast(idx, shrink_image_half(original_frame))
+
+    def shard_result(self):
+        return (
+            self.unique_filename,
+            self.mask_filename,
+            motion_index_filename(self.base_filename),
+        )
 
     def frame(self, idx, original_frame):
-        self.state.idx = idx
-
         # PERF: Processing at 1/4 size boosts FPS by TK%
         in_frame = shrink_image_half(original_frame)
 
         # PERF: Motion Mask sampled frames
-        motion_mask = to_motion_mask_fast(self.state, in_frame)
+        motion_mask = self.analyzer.to_motion_mask_fast(idx, in_frame)
+        if idx < len(self.motion_index):
+            self.motion_index[idx] = self.analyzer.last_stats
 
         # skip frames with no motion
         if is_frame_black(motion_mask):
@@ -256,15 +430,188 @@ class remove_background:
         self.output_unique_mask.write(masked_input)
 
 
+# Pass 1 scores at 1/4 size, half the size remove_background analyses at, so
+# the kernels and contour areas shrink to match.
+score_scale = 4
+score_motion_params = {"erode_size": 5, "dilate_size": 20, "fill_size": 100}
+score_min_contour_area = 100 / 4
+
+
+class MotionScorer:
+    # Pass 1: per-frame motion index, without writing any video
+    def __init__(self, base_filename, **motion_params):
+        self.base_filename = base_filename
+        self.motion_params = {
+            **score_motion_params,
+            "min_contour_area": score_min_contour_area,
+            **motion_params,
+        }
+
+    def create(self, input_video):
+        self.analyzer = MotionAnalyzer(**self.motion_params)
+        self.fps = input_video.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(input_video.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.motion_index = new_motion_index(self.frame_count)
+        # PERF: The background model only sees analysis frames, so don't
+        # decode the rest.
+        self.frame_stride = self.analyzer.key_frame_rate
+
+    def destroy(self):
+        # Frames between analysis frames keep the last analysis score, the
+        # same as to_motion_mask_fast re-using the last mask.
+        scored = ~np.isnan(self.motion_index["nonzero_fraction"])
+        last = np.maximum.accumulate(
+            np.where(scored, np.arange(len(self.motion_index)), 0)
+        )
+        self.motion_index = self.motion_index[last]
+        save_motion_index(self.base_filename, self.motion_index)
+
+    def frame(self, idx, frame):
+        if idx >= self.frame_count:
+            return
+        h, w = frame.shape[:2]
+        small = cv2.resize(
+            frame, (w // score_scale, h // score_scale), interpolation=cv2.INTER_AREA
+        )
+        self.analyzer.to_motion_mask_fast(idx, small)
+        self.motion_index[idx] = self.analyzer.last_stats
+
+
+def motion_intervals(
+    scores, fps, threshold=None, gap_seconds=2.0, pad_seconds=2.0
+) -> list[tuple[int, int]]:
+    """
+    Pass 2: [start, end) frame intervals to keep.
+
+    Runs of motion closer than gap_seconds are joined, then each interval is
+    padded by pad_seconds on both sides, giving <same-2s>-<motion>-<same-2s>.
+    """
+    if threshold is None:
+        threshold = 0.01 * percent_image_non_zero_still_black
+    moving = np.concatenate(([False], np.asarray(scores) >= threshold, [False]))
+    edges = np.flatnonzero(np.diff(moving.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    if len(starts) == 0:
+        return []
+
+    # Fill gaps: drop the boundaries where the gap to the next run is short
+    gap_frames = int(gap_seconds * fps)
+    keep = np.concatenate((starts[1:] - ends[:-1] > gap_frames, [True]))
+    ends = ends[keep]
+    starts = starts[np.concatenate(([True], keep[:-1]))]
+
+    # Pad, then merge intervals the padding made overlap
+    pad_frames = int(pad_seconds * fps)
+    starts = np.maximum(starts - pad_frames, 0)
+    ends = np.minimum(ends + pad_frames, len(scores))
+    intervals = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(end, intervals[-1][1]))
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+class IntervalWriter:
+    # Pass 3: copy the kept intervals out, nothing is re-analysed
+    def __init__(self, output_filename, intervals: list[tuple[int, int]]):
+        self.output_filename = output_filename
+        self.intervals = intervals
+        self.starts = [start for start, _ in intervals]
+
+    def create(self, input_video):
+        in_fps = input_video.get(cv2.CAP_PROP_FPS)
+        self.writer = cv_helper.LazyVideoWriter(self.output_filename, in_fps)
+
+    def destroy(self):
+        self.writer.release()
+
+    def wants_frame(self, idx):
+        # PERF: Frames outside the intervals are never decoded to BGR
+        i = bisect.bisect_right(self.starts, idx) - 1
+        return i >= 0 and idx < self.intervals[i][1]
+
+    def frame(self, idx, frame):
+        self.writer.write(frame)
+
+
+def motion_analysis_filename(base_filename):
+    # The intervals and the parameters that made them, the scores are in the
+    # motion index
+    return f"{base_filename}_intervals.json"
+
+
+def save_motion_analysis(base_filename, analysis):
+    with open(motion_analysis_filename(base_filename), "w") as f:
+        json.dump(analysis, f)
+
+
+def score_motion(video_input_file, base_filename, force=False):
+    # Pass 1 is the expensive one, re-use the motion index (from an earlier
+    # TrimMotion or RemoveBackground) unless forced.
+    index = load_motion_index(base_filename)
+    if force or index is None:
+        cv_helper.process_video(
+            cv_helper.cv2_video(video_input_file), MotionScorer(base_filename)
+        )
+        index = load_motion_index(base_filename)
+    else:
+        ic(f"Using motion index from {motion_index_filename(base_filename)}")
+
+    input_video = cv_helper.cv2_video(video_input_file)
+    fps = input_video.get(cv2.CAP_PROP_FPS)
+    input_video.release()
+    # Frames never analysed count as no motion
+    return fps, np.nan_to_num(index["nonzero_fraction"])
+
+
+def remove_background_shard(base_filename, shard: cv_helper.Shard, **motion_params):
+    return remove_background(f"{base_filename}.shard{shard.index:03d}", **motion_params)
+
+
+def remove_background_sharded(video_input_file, base_filename, shards, **motion_params):
+    # MOG2 only sees analysis frames, so prime it with a full history of them
+    warmup_frames = background_history * analysis_key_frame_rate
+    shard_outputs = cv_helper.process_video_sharded(
+        video_input_file,
+        functools.partial(remove_background_shard, base_filename, **motion_params),
+        shards=shards,
+        warmup_frames=warmup_frames,
+    )
+
+    input_video = cv_helper.cv2_video(video_input_file)
+    in_fps = input_video.get(cv2.CAP_PROP_FPS)
+    input_video.release()
+    unique_segments, mask_segments, index_segments = zip(*shard_outputs)
+    cv_helper.concat_videos(unique_segments, f"{base_filename}_unique.mp4", in_fps)
+    cv_helper.concat_videos(mask_segments, f"{base_filename}_mask.mp4", in_fps)
+    save_motion_index(
+        base_filename, join_motion_indexes([np.load(p) for p in index_segments])
+    )
+    for p in index_segments:
+        os.remove(p)
+
+
 @app.command()
 def RemoveBackground(
-    video_input_file: str = typer.Argument("in.mp4"), force: bool = typer.Option(False)
+    video_input_file: str = typer.Argument("in.mp4"),
+    force: bool = typer.Option(False),
+    shards: int = typer.Option(
+        1, help="Split the video across this many processes, 0 for one per core"
+    ),
+    stream_copy: bool = typer.Option(
+        False, help="Score motion, then cut _unique.mp4 with a packet copy (no mask)"
+    ),
+    proxy_scale: int = typer.Option(
+        1, help="Run contour morphology this many times smaller, see CheckContours"
+    ),
 ) -> None:
     """
     Remove background from Ring Video
     """
     ic(f"Removing Video Background {video_input_file}")
-    base_filename = video_input_file.split(".")[0]
+    base_filename = base_filename_for(video_input_file)
     unique_filename = f"{base_filename}_unique.mp4"
 
     if not force and os.path.exists(unique_filename):
@@ -277,9 +624,248 @@ def RemoveBackground(
         return
 
     ic(f"Processing File {video_input_file}")
-    rb = remove_background(base_filename)
+    if stream_copy:
+        input_video.release()
+        return trim_motion(video_input_file, force_analyze=force, stream_copy=True)
+
+    if shards != 1:
+        input_video.release()
+        return remove_background_sharded(
+            video_input_file, base_filename, shards, proxy_scale=proxy_scale
+        )
+
+    rb = remove_background(base_filename, proxy_scale=proxy_scale)
+    return cv_helper.process_video(input_video, rb)
+
+
+def base_filename_for(video_input_file):
+    return os.path.splitext(video_input_file)[0]
+
+
+video_extensions = {".mp4", ".mov", ".mkv", ".avi"}
+
+
+def expand_video_inputs(inputs):
+    # Directories and globs expand to videos, skipping our own outputs
+    paths = []
+    for i in inputs:
+        i = os.path.expanduser(i)
+        if os.path.isdir(i):
+            paths += [os.path.join(i, f) for f in sorted(os.listdir(i))]
+        else:
+            paths += sorted(glob.glob(i)) or [i]
+    return [
+        p
+        for p in paths
+        if os.path.splitext(p)[1].lower() in video_extensions
+        and not p.endswith(("_unique.mp4", "_mask.mp4"))
+    ]
+
+
+def load_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path, manifest):
+    cv_helper.atomic_write_json(manifest_path, manifest)
+
+
+def manifest_key(video_input_file):
+    stat = os.stat(video_input_file)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def remove_background_file(video_input_file, **motion_params) -> cv_helper.ProcessStats:
+    input_video = cv_helper.cv2_video(video_input_file)
+    rb = remove_background(base_filename_for(video_input_file), **motion_params)
     return cv_helper.process_video(input_video, rb)
 
 
+@app.command()
+def RemoveBackgroundBatch(
+    inputs: list[str] = typer.Argument(..., help="Video files, directories or globs"),
+    workers: int = typer.Option(0, help="Worker processes, 0 for one per core"),
+    manifest_path: str = typer.Option(
+        "remove_background_manifest.json",
+        "--manifest",
+        help="Records finished inputs so a crashed run can resume",
+    ),
+    force: bool = typer.Option(False),
+    proxy_scale: int = typer.Option(
+        1, help="Run contour morphology this many times smaller, see CheckContours"
+    ),
+) -> None:
+    """
+    Remove background from many Ring Videos on a process pool
+    """
+    manifest = load_manifest(manifest_path)
+    todo = []
+    for video_input_file in expand_video_inputs(inputs):
+        path = os.path.abspath(video_input_file)
+        key = manifest_key(path)
+        entry = manifest.get(path, {})
+        if not force:
+            # Manifest says done for this exact input, no need to check outputs
+            if entry.get("status") == "done" and all(
+                entry.get(k) == v for k, v in key.items()
+            ):
+                continue
+            # Only trust an existing output when the manifest knows nothing
+            # about the input, a failed/running/stale entry means rebuild it
+            unique_filename = f"{base_filename_for(path)}_unique.mp4"
+            if not entry and os.path.exists(unique_filename):
+                print(f"{unique_filename} exists, skipping")
+                manifest[path] = {**key, "status": "done"}
+                continue
+        todo.append(path)
+    # Mark running up front, so an interrupted batch doesn't look finished
+    for path in todo:
+        manifest[path] = {**manifest_key(path), "status": "running"}
+    save_manifest(manifest_path, manifest)
+    ic(len(todo), "Videos To Process")
+
+    total_frames = 0
+    start = time.perf_counter()
+    with cv_helper.process_pool(workers or os.cpu_count()) as pool:
+        futures = {
+            pool.submit(remove_background_file, p, proxy_scale=proxy_scale): p
+            for p in todo
+        }
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                stats = future.result()
+                total_frames += stats.frames
+                manifest[path] = {
+                    **manifest_key(path),
+                    "status": "done",
+                    "frames": stats.frames,
+                    "elapsed": round(stats.elapsed, 2),
+                }
+            except Exception as e:  # noqa: BLE001
+                # One bad video is recorded as failed, the batch carries on
+                print(f"Failed {path}: {e}")
+                manifest[path] = {**manifest_key(path), "status": "failed"}
+            save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - start
+    batch_fps = int(total_frames / max(elapsed, 1e-6))
+    ic(len(todo), total_frames, int(elapsed), batch_fps)
+
+
+@app.command()
+def CheckContours(
+    video_input_file: str = typer.Argument("in.mp4"),
+    proxy_scale: int = typer.Option(4),
+) -> None:
+    """
+    Regression check to_contours_fast against to_contours on a real video
+    """
+    input_video = cv_helper.cv2_video(video_input_file)
+    analyzer = MotionAnalyzer()
+    agree, total, ious = 0, 0, []
+    reference_seconds, fast_seconds = 0.0, 0.0
+    frames = cv_helper.video_reader(input_video, stride=analyzer.key_frame_rate)
+    for idx, frame in frames:
+        # Same input remove_background analyses: half size, grayscale
+        fg_mask = analyzer.backSub.apply(to_grayscale(shrink_image_half(frame)))
+
+        start = time.perf_counter()
+        reference = to_contours(fg_mask)
+        reference_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        fast = to_contours_fast(fg_mask, proxy_scale=proxy_scale)
+        fast_seconds += time.perf_counter() - start
+
+        total += 1
+        agree += is_frame_black(reference) == is_frame_black(fast)
+        union = np.count_nonzero(reference | fast)
+        if union:
+            ious.append(np.count_nonzero(reference & fast) / union)
+
+    ic(total, agree, total - agree)
+    if ious:
+        ic(float(np.mean(ious)), float(np.min(ious)))
+    speedup = reference_seconds / max(fast_seconds, 1e-9)
+    ic(reference_seconds, fast_seconds, speedup)
+    if agree != total:
+        raise typer.Exit(1)
+
+
+def trim_motion(
+    video_input_file,
+    gap_seconds=2.0,
+    pad_seconds=2.0,
+    threshold=None,
+    force_analyze=False,
+    stream_copy=False,
+    reencode_edges=False,
+):
+    base_filename = base_filename_for(video_input_file)
+    fps, scores = score_motion(video_input_file, base_filename, force_analyze)
+
+    intervals = motion_intervals(scores, fps, threshold, gap_seconds, pad_seconds)
+    analysis = {
+        "fps": fps,
+        "params": {
+            "gap_seconds": gap_seconds,
+            "pad_seconds": pad_seconds,
+            "threshold": threshold,
+        },
+        "intervals": intervals,
+    }
+    save_motion_analysis(base_filename, analysis)
+    kept_seconds = sum(end - start for start, end in intervals) / fps
+    ic(intervals, kept_seconds)
+
+    unique_filename = f"{base_filename}_unique.mp4"
+    if stream_copy:
+        # PERF: Cut the original packets instead of decoding and re-encoding
+        cv_helper.cut_stream_copy(
+            video_input_file,
+            [(start / fps, end / fps) for start, end in intervals],
+            unique_filename,
+            reencode_edges=reencode_edges,
+        )
+        return
+
+    writer = IntervalWriter(unique_filename, intervals)
+    cv_helper.process_video(cv_helper.cv2_video(video_input_file), writer)
+
+
+@app.command()
+def TrimMotion(
+    video_input_file: str = typer.Argument("in.mp4"),
+    gap_seconds: float = typer.Option(2.0, help="Join motion closer than this"),
+    pad_seconds: float = typer.Option(2.0, help="Keep this much before/after"),
+    threshold: float = typer.Option(
+        None, help="Motion fraction of a frame to count as motion"
+    ),
+    force_analyze: bool = typer.Option(False, help="Re-score even if cached"),
+    stream_copy: bool = typer.Option(
+        False, help="Cut with ffmpeg packet copy instead of re-encoding frames"
+    ),
+    reencode_edges: bool = typer.Option(
+        False,
+        help="With stream copy, re-encode partial GOPs (h264/hevc) for exact cuts",
+    ),
+) -> None:
+    """
+    Trim a Ring Video to its motion, in passes so re-cuts skip the analysis
+    """
+    trim_motion(
+        video_input_file,
+        gap_seconds,
+        pad_seconds,
+        threshold,
+        force_analyze,
+        stream_copy,
+        reencode_edges,
+    )
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,278 @@
+# Columnar pose cache - what CaptureYoloData saves and SwingsProcessor reads.
+#
+# The old output/<name>-yolo.pickle.gz was a (plain) pickle of pydantic
+# YoloFrames wrapping ultralytics Keypoints tensors: big, slow to load, and
+# broken by torch/ultralytics upgrades. This is plain arrays in one .npz:
+#
+#   version       int32 ()               POSE_CACHE_VERSION
+#   fps           float64 ()             of the source video
+#   orig_shape    int32 (2,)             (height, width) of the source video
+#   frames        int32 (F,)             frame index of each row
+#   person_count  int16 (F,)             people detected in the frame
+#   keypoints     float32 (F, P, 17, 3)  x, y normalized 0->1, conf; NaN pad
+#   track_ids     int32 (F, P)           PoseTracker id of each person; -1 pad
+#
+# Version 1 caches have no track_ids, they're tracked when loaded.
+
+import struct
+import zipfile
+
+import numpy as np
+
+POSE_CACHE_VERSION = 2
+KEYPOINT_COUNT = 17
+
+
+class Pose:
+    # Quacks like ultralytics Keypoints for pose_helper.Body and add_pose,
+    # arrays are (persons, 17, 2) and (persons, 17)
+    def __init__(self, keypoints, orig_shape):
+        self.keypoints = keypoints
+        self.orig_shape = orig_shape
+
+    def __len__(self):
+        return len(self.keypoints)
+
+    @property
+    def xyn(self):
+        return self.keypoints[..., :2]
+
+    @property
+    def xy(self):
+        height, width = self.orig_shape
+        return self.xyn * np.array([width, height], np.float32)
+
+    @property
+    def conf(self):
+        return self.keypoints[..., 2]
+
+
+def keypoints_to_array(keypoints):
+    """ultralytics Keypoints (all people, or a list of one per person) to (P, 17, 3)"""
+    people = []
+    for person in keypoints:
+        xyn = person.xyn[0].cpu().numpy()
+        if person.conf is not None:
+            conf = person.conf[0].cpu().numpy()
+        else:
+            conf = np.ones(KEYPOINT_COUNT, np.float32)
+        people.append(np.column_stack([xyn, conf]))
+    if not people:
+        return np.zeros((0, KEYPOINT_COUNT, 3), np.float32)
+    return np.stack(people).astype(np.float32)
+
+
+class PoseTracker:
+    """
+    Gives each person a stable id across frames: greedily match detections
+    to the closest live track by mean distance of the keypoints both can see
+    (normalized, so max_distance is a fraction of the frame). Unmatched
+    detections start new tracks, tracks unseen for max_missing frames end.
+    """
+
+    def __init__(self, max_distance: float = 0.1, max_missing: int = 30):
+        self.max_distance = max_distance
+        self.max_missing = max_missing
+        self.next_id = 0
+        self.track_ids = np.zeros(0, np.int32)
+        self.track_keypoints = np.zeros((0, KEYPOINT_COUNT, 3), np.float32)
+        self.track_last_seen = np.zeros(0, np.int64)
+        self.frames_seen = {}  # id -> frames, to pick out the main athlete
+
+    def distances(self, people):
+        # (people, tracks) mean distance over keypoints visible in both
+        visible = (people[:, None, :, 2] > 0.5) & (
+            self.track_keypoints[None, :, :, 2] > 0.5
+        )
+        moved = np.linalg.norm(
+            people[:, None, :, :2] - self.track_keypoints[None, :, :, :2], axis=-1
+        )
+        count = visible.sum(axis=-1)
+        total = np.where(visible, moved, 0).sum(axis=-1)
+        return np.where(count > 0, total / np.maximum(count, 1), np.inf)
+
+    def update(self, people, frame_idx: int):
+        """(persons, 17, 3) detections in frame_idx -> (persons,) track ids"""
+        ids = np.full(len(people), -1, np.int32)
+        if len(people) and len(self.track_ids):
+            distances = self.distances(people)
+            matched_tracks = set()
+            for flat in np.argsort(distances, axis=None, kind="stable"):
+                person, track = divmod(int(flat), len(self.track_ids))
+                if distances[person, track] > self.max_distance:
+                    break
+                if ids[person] != -1 or track in matched_tracks:
+                    continue
+                matched_tracks.add(track)
+                ids[person] = self.track_ids[track]
+                self.track_keypoints[track] = people[person]
+                self.track_last_seen[track] = frame_idx
+
+        new = ids == -1
+        ids[new] = np.arange(self.next_id, self.next_id + new.sum())
+        self.next_id += int(new.sum())
+        self.track_ids = np.r_[self.track_ids, ids[new]].astype(np.int32)
+        self.track_keypoints = np.concatenate([self.track_keypoints, people[new]])
+        self.track_last_seen = np.r_[
+            self.track_last_seen, np.full(new.sum(), frame_idx, np.int64)
+        ]
+
+        alive = frame_idx - self.track_last_seen <= self.max_missing
+        self.track_ids = self.track_ids[alive]
+        self.track_keypoints = self.track_keypoints[alive]
+        self.track_last_seen = self.track_last_seen[alive]
+        for track_id in ids.tolist():
+            self.frames_seen[track_id] = self.frames_seen.get(track_id, 0) + 1
+        return ids
+
+    def main_track(self):
+        """Id seen in the most frames so far, None before anyone's seen"""
+        if not self.frames_seen:
+            return None
+        return max(self.frames_seen, key=self.frames_seen.get)
+
+
+def track_people(frames, person_count, keypoints):
+    """(F, P) track ids for a pose cache's keypoints, -1 where nobody is"""
+    tracker = PoseTracker()
+    track_ids = np.full(keypoints.shape[:2], -1, np.int32)
+    for row, (frame_idx, count) in enumerate(
+        zip(frames.tolist(), person_count.tolist())
+    ):
+        if count:
+            people = np.asarray(keypoints[row, :count])
+            track_ids[row, :count] = tracker.update(people, frame_idx)
+    return track_ids
+
+
+def save_pose_cache(path, frames, keypoints, fps: float, orig_shape):
+    """keypoints is one (persons, 17, 3) array per frame"""
+    max_people = max((len(k) for k in keypoints), default=0)
+    block = np.full(
+        (len(frames), max(1, max_people), KEYPOINT_COUNT, 3), np.nan, np.float32
+    )
+    for row, people in enumerate(keypoints):
+        block[row, : len(people)] = people
+    frames = np.array(frames, np.int32)
+    person_count = np.array([len(k) for k in keypoints], np.int16)
+
+    np.savez(
+        path,
+        version=np.int32(POSE_CACHE_VERSION),
+        fps=np.float64(fps),
+        orig_shape=np.array(orig_shape, np.int32),
+        frames=frames,
+        person_count=person_count,
+        keypoints=block,
+        track_ids=track_people(frames, person_count, block),
+    )
+
+
+def save_yolo_frames(path, yolo_frames, fps: float):
+    orig_shape = (0, 0)
+    keypoints = []
+    for yolo_frame in yolo_frames:
+        people = yolo_frame.yolo_results.keypoints
+        if len(people):
+            orig_shape = people[0].orig_shape
+        keypoints.append(keypoints_to_array(people))
+    save_pose_cache(path, [f.frame for f in yolo_frames], keypoints, fps, orig_shape)
+
+
+def load_npz_mmap(path):
+    """
+    name -> array for an uncompressed .npz (what np.savez writes), with each
+    array memory-mapped straight out of the zip. np.load ignores mmap_mode
+    for .npz, and reading a long session's keypoints up front is most of
+    the start-up time.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed, can't memory-map it")
+            # The local header has its own (maybe different) extra field
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            if np.lib.format.read_magic(f) == (1, 0):
+                header = np.lib.format.read_array_header_1_0(f)
+            else:
+                header = np.lib.format.read_array_header_2_0(f)
+            shape, fortran_order, dtype = header
+            name = info.filename.removesuffix(".npy")
+            if 0 in shape or shape == ():
+                # np.memmap can't map empty arrays, and scalars are tiny anyway
+                arrays[name] = np.fromfile(f, dtype, count=int(np.prod(shape)))
+                arrays[name] = arrays[name].reshape(shape)
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+class PoseCache:
+    # Keypoints are memory-mapped, so opening is instant and only the frames
+    # actually read get paged in, however long the session
+    def __init__(self, path):
+        cache = load_npz_mmap(path)
+        version = int(cache["version"])
+        if version not in (1, POSE_CACHE_VERSION):
+            raise ValueError(
+                f"{path} is pose cache version {version}, "
+                f"expected {POSE_CACHE_VERSION}, regenerate it"
+            )
+        self.fps = float(cache["fps"])
+        self.orig_shape = tuple(int(x) for x in cache["orig_shape"])
+        self.frames = cache["frames"]
+        self.person_count = cache["person_count"]
+        self.keypoints = cache["keypoints"]
+        if "track_ids" in cache:
+            self.track_ids = cache["track_ids"]
+        else:
+            self.track_ids = track_people(
+                self.frames, self.person_count, self.keypoints
+            )
+        # Captures have a row per frame, so usually the row is the frame
+        self.is_dense = np.array_equal(self.frames, np.arange(len(self.frames)))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def athletes(self):
+        """Track ids, the one in the most frames (the main athlete) first"""
+        ids, counts = np.unique(self.track_ids[self.track_ids >= 0], return_counts=True)
+        return ids[np.argsort(-counts, kind="stable")].tolist()
+
+    def row(self, frame_idx: int):
+        if self.is_dense:
+            return frame_idx if frame_idx < len(self.frames) else None
+        row = int(np.searchsorted(self.frames, frame_idx))
+        if row < len(self.frames) and self.frames[row] == frame_idx:
+            return row
+        return None
+
+    def __getitem__(self, frame_idx: int):
+        """Pose for frame_idx, None if nobody was detected"""
+        row = self.row(frame_idx)
+        if row is None or self.person_count[row] == 0:
+            return None
+        people = self.keypoints[row, : self.person_count[row]]
+        return Pose(np.asarray(people), self.orig_shape)
+
+    def athlete_pose(self, frame_idx: int, track_id: int):
+        """Pose of just this athlete in frame_idx, None if they're not there"""
+        row = self.row(frame_idx)
+        if row is None:
+            return None
+        (people,) = np.nonzero(self.track_ids[row] == track_id)
+        if len(people) == 0:
+            return None
+        return Pose(np.asarray(self.keypoints[row, people[:1]]), self.orig_shape)
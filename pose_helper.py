@@ -1,6 +1,8 @@
 from enum import Enum
 from typing import NamedTuple
+import csv
 import math
+import numpy as np
 import torch
 import ultralytics
 
@@ -45,6 +47,38 @@ def is_interesting_body_part(index):
 Bone = NamedTuple("Bone", [("bottom", torch.tensor), ("top", torch.tensor)])
 
 
+def keypoint_motion(a: ultralytics.engine.results.Keypoints, b) -> float:
+    """
+    Most any person moved from a to b: the mean normalized distance of
+    the keypoints both sides see, pairing people in detection order.
+    Nobody either side is no motion, people coming or going is infinite.
+    """
+    if len(a) != len(b):
+        return math.inf
+    if len(a) == 0:
+        return 0.0
+    visible = torch.ones(a.xyn.shape[:2], dtype=torch.bool)
+    if a.conf is not None and b.conf is not None:
+        visible = (a.conf > 0.5) & (b.conf > 0.5)
+    # If YOLO swapped the order of two people, that's a big move here, so
+    # the span gets sampled rather than blending one person into the other
+    moved = (a.xyn - b.xyn).norm(dim=-1) * visible
+    per_person = moved.sum(dim=1) / visible.sum(dim=1).clamp(min=1)
+    return float(per_person.max())
+
+
+def interpolate_keypoints(
+    a: ultralytics.engine.results.Keypoints, b, t: float
+) -> ultralytics.engine.results.Keypoints:
+    # Linear between a (t=0) and b (t=1) pairing people the way
+    # keypoint_motion does, nearest if the people don't match up
+    if len(a) == 0 or len(a) != len(b):
+        return a if t < 0.5 else b
+    return ultralytics.engine.results.Keypoints(
+        torch.lerp(a.data, b.data, t), a.orig_shape
+    )
+
+
 class SwingRepCounter:
     def __init__(self):
         self.HINGE = 0
@@ -83,8 +117,83 @@ class SwingRepCounter:
                 self.transition_counter = 0
 
 
+def hinge_transitions(is_hinge: np.ndarray, threshold: int = 5):
+    """
+    SwingRepCounter over a whole series at once: (rows, states) where it
+    confirms a change of state, True for HINGE. The counter only moves on a
+    run of threshold identical frames, so its state is always that of the
+    last run at least threshold long, and it changes on the first frame of
+    each such run that differs from the one before (starting from HINGE).
+    The counter confirms threshold - 1 frames after the returned row.
+    """
+    is_hinge = np.asarray(is_hinge, bool)
+    if len(is_hinge) == 0:
+        return np.zeros(0, np.int64), np.zeros(0, bool)
+    run_starts = np.flatnonzero(np.r_[True, is_hinge[1:] != is_hinge[:-1]])
+    run_lengths = np.diff(np.r_[run_starts, len(is_hinge)])
+    starts = run_starts[run_lengths >= threshold]
+    states = is_hinge[starts]
+    changed = states != np.r_[True, states[:-1]]
+    return starts[changed], states[changed]
+
+
+def segment_reps(metrics: dict, frames: np.ndarray, fps: float, threshold: int = 5):
+    """
+    Rep table (dict of columns) from body_metrics, counting reps exactly like
+    SwingRepCounter (spine_vertical < 45 is a hinge, a rep on every
+    STRAIT -> HINGE). Frames with nobody in them are skipped, as when
+    rendering. A rep runs from the start of its hinge to the frame before the
+    next rep's, the apex is its most upright frame.
+    """
+    back = metrics["spine_vertical"]
+    rows = np.flatnonzero(~np.isnan(back))
+    back = back[rows].astype(np.int64)
+    hip = metrics["hip_angle"][rows].astype(np.int64)
+    frames = np.asarray(frames)[rows]
+
+    starts, states = hinge_transitions(back < 45, threshold)
+    rep_starts = starts[states]
+    rep_ends = np.r_[rep_starts, len(rows)][1:] - 1
+    # Rows from the first rep on are all in some rep, so reduceat works
+    first = rep_starts[0] if len(rep_starts) else len(rows)
+    back, hip, frames = back[first:], hip[first:], frames[first:]
+    rep_starts, rep_ends = rep_starts - first, rep_ends - first
+
+    def per_rep(ufunc, column):
+        return ufunc.reduceat(column, rep_starts) if len(rep_starts) else column
+
+    rep_of_row = np.repeat(np.arange(len(rep_starts)), rep_ends - rep_starts + 1)
+    # First row of each rep at its most upright
+    upright = np.flatnonzero(back == per_rep(np.minimum, back)[rep_of_row])
+    apex = upright[np.diff(rep_of_row[upright], prepend=-1) != 0]
+
+    return {
+        "rep": np.arange(1, len(rep_starts) + 1),
+        "start_frame": frames[rep_starts],
+        "apex_frame": frames[apex],
+        "end_frame": frames[rep_ends],
+        "duration_seconds": (frames[rep_ends] - frames[rep_starts] + 1) / fps,
+        "min_hip_angle": per_rep(np.minimum, hip),
+        "max_back_angle": per_rep(np.maximum, back),
+    }
+
+
+def save_table(path: str, table: dict):
+    """dict of columns to .csv, or .parquet (needs pandas and pyarrow)"""
+    if path.endswith(".parquet"):
+        import pandas as pd
+
+        pd.DataFrame(table).to_parquet(path, index=False)
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(table.keys())
+        writer.writerows(zip(*(column.tolist() for column in table.values())))
+
+
 class Body:
-    # take a [(x,y)],[conf] as input
+    # take a [(x,y)],[conf] as input, either ultralytics Keypoints or a
+    # pose_cache.Pose
     def __init__(self, keypoints: ultralytics.engine.results.Keypoints):
         self.predicted_keypoints = keypoints
         self.keypoints = keypoints.xyn[0]
@@ -136,11 +245,12 @@ class Body:
 
 
 def make_angle(bone1: Bone, bone2: Bone) -> float:
-    if torch.equal(bone1.top, bone2.top):
+    # np, not torch, so Keypoints and pose_cache.Pose both work
+    if np.array_equal(np.asarray(bone1.top), np.asarray(bone2.top)):
         # if passed in wrong ends swap them
         bone2 = Bone(bone2.top, bone2.bottom)
     else:
-        assert torch.equal(bone1.bottom, bone2.bottom), (
+        assert np.array_equal(np.asarray(bone1.bottom), np.asarray(bone2.bottom)), (
             "Both bones should have same bottom"
         )
 
@@ -165,6 +275,95 @@ def bone_to_vertical(bone: Bone):
     return abs(int(90 - bone_to_horizontal(bone)))
 
 
+# Array versions of the above, over any leading shape (usually frames).
+# Differences are taken in float32 and angles in float64, same as the
+# per-frame code does with float32 keypoints, so the truncated ints agree.
+# Frames without a person (NaN keypoints) come out NaN.
+
+
+def bones_to_horizontal(bottom: np.ndarray, top: np.ndarray) -> np.ndarray:
+    d = (top - bottom).astype(np.float64)
+    return np.trunc(np.abs(np.degrees(np.arctan2(d[..., 1], d[..., 0]))))
+
+
+def bones_to_vertical(bottom: np.ndarray, top: np.ndarray) -> np.ndarray:
+    return np.abs(90 - bones_to_horizontal(bottom, top))
+
+
+def make_angles(bone1, bone2) -> np.ndarray:
+    # bones are (bottom, top) arrays, see make_angle for the (odd) math
+    (bottom1, top1), (bottom2, top2) = bone1, bone2
+    swap = np.all(top1 == top2, axis=-1, keepdims=True)
+    touch = bottom1
+    top_end = top1
+    bottom_end = np.where(swap, bottom2, top2)
+    top_bone_angle = np.arctan2(
+        (top_end[..., 1] - touch[..., 1]).astype(np.float64),
+        (top_end[..., 0] - touch[..., 0]).astype(np.float64),
+    )
+    bottom_bone_angle = np.arctan2(
+        (bottom_end[..., 1] - touch[..., 1]).astype(np.float64),
+        (bottom_end[..., 0] - top_end[..., 0]).astype(np.float64),
+    )
+    return np.trunc(np.degrees(np.abs(top_bone_angle) + np.abs(bottom_bone_angle)))
+
+
+def body_metrics(xyn: np.ndarray) -> dict:
+    """
+    Every Body metric for a (frames, 17, 2) block of normalized keypoints, as
+    a dict of (frames,) float columns. knee_angle is left out, make_angle
+    asserts on it.
+    """
+    xyn = np.asarray(xyn, np.float32)
+
+    def bone(bottom: BodyPart, top: BodyPart):
+        return xyn[..., bottom.value, :], xyn[..., top.value, :]
+
+    neck = bone(BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_EAR)
+    spine = bone(BodyPart.RIGHT_HIP, BodyPart.RIGHT_SHOULDER)
+    total_arm = bone(BodyPart.RIGHT_SHOULDER, BodyPart.RIGHT_ELBOW)
+    leg_upper = bone(BodyPart.RIGHT_HIP, BodyPart.RIGHT_KNEE)
+    leg_lower = bone(BodyPart.RIGHT_KNEE, BodyPart.RIGHT_ANKLE)
+
+    spine_vertical = bones_to_vertical(*spine)
+    return {
+        "hip_angle": make_angles(leg_upper, spine),
+        "armpit_angle": make_angles(spine, leg_upper),
+        "spine_vertical": spine_vertical,
+        "neck_to_head": bones_to_vertical(*neck) - spine_vertical,
+        "leg_lower_vertical": bones_to_vertical(*leg_lower),
+        "arm_horizontal": bones_to_horizontal(*total_arm),
+    }
+
+
+def athlete_metrics(metrics: dict, track_ids: np.ndarray, track_id: int) -> dict:
+    """
+    body_metrics of every (row, person) narrowed down to one tracked athlete,
+    (rows,) columns that are NaN where they're not in frame
+    """
+    rows, people = np.nonzero(track_ids == track_id)
+    athlete = {}
+    for name, column in metrics.items():
+        athlete[name] = np.full(len(track_ids), np.nan)
+        athlete[name][rows] = column[rows, people]
+    return athlete
+
+
+def metrics_row(metrics: dict, row):
+    """One frame (or (frame, person)) of body_metrics as ints, None if nobody was there"""
+    if np.isnan(metrics["spine_vertical"][row]):
+        return None
+    return {name: int(column[row]) for name, column in metrics.items()}
+
+
+def frame_metrics(keypoints) -> dict:
+    # First person of a Keypoints or pose_cache.Pose
+    xyn = keypoints.xyn[:1]
+    if isinstance(xyn, torch.Tensor):
+        xyn = xyn.cpu().numpy()
+    return metrics_row(body_metrics(xyn), 0)
+
+
 def add_pose(
     keypoints: ultralytics.engine.results.Keypoints,
     frame,
@@ -172,6 +371,7 @@ def add_pose(
     im,
     label,
     show_body_parts=True,
+    metrics=None,
 ):
     import cv_helper
     import cv2
@@ -186,12 +386,15 @@ def add_pose(
     # ic(keypoints, confidence)
 
     b = Body(keypoints)
+    # Precomputed (see body_metrics) when rendering from a pose cache
+    if metrics is None:
+        metrics = frame_metrics(keypoints)
     stats = f""" REP: {rep}
- Hip:{b.hip_angle()}
- LowerLeg:{bone_to_vertical(b.r_leg_lower())}
- Back:{b.spine_vertical()}
- Neck:{b.neck_to_head()}
- Arm:{bone_to_horizontal(b.r_total_arm())}
+ Hip:{metrics["hip_angle"]}
+ LowerLeg:{metrics["leg_lower_vertical"]}
+ Back:{metrics["spine_vertical"]}
+ Neck:{metrics["neck_to_head"]}
+ Arm:{metrics["arm_horizontal"]}
  Frame:{frame}
  {label}
  """
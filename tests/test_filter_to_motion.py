@@ -0,0 +1,104 @@
+# motion_intervals and to_contours_fast against frame at a time / full size
+# versions, on synthetic scores and masks, so a change in what gets kept
+# shows up here rather than in a trimmed video.
+
+import cv2
+import numpy as np
+import pytest
+
+import filter_to_motion
+
+
+def motion_intervals_reference(scores, fps, threshold, gap_seconds, pad_seconds):
+    # Frame at a time: keep moving frames, fill short gaps, pad, merge
+    moving = [score >= threshold for score in scores]
+    gap_frames, pad_frames = int(gap_seconds * fps), int(pad_seconds * fps)
+    keep = list(moving)
+    last_moving = None
+    for idx, is_moving in enumerate(moving):
+        if not is_moving:
+            continue
+        if last_moving is not None and idx - last_moving - 1 <= gap_frames:
+            keep[last_moving:idx] = [True] * (idx - last_moving)
+        last_moving = idx
+    padded = [False] * len(scores)
+    for idx, kept in enumerate(keep):
+        if kept:
+            for i in range(
+                max(0, idx - pad_frames), min(len(scores), idx + pad_frames + 1)
+            ):
+                padded[i] = True
+    intervals = []
+    for idx, kept in enumerate(padded):
+        if kept and intervals and intervals[-1][1] == idx:
+            intervals[-1] = (intervals[-1][0], idx + 1)
+        elif kept:
+            intervals.append((idx, idx + 1))
+    return intervals
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize(
+    "gap_seconds,pad_seconds",
+    [(2.0, 2.0), (0.0, 0.0), (1.0, 0.0), (0.5, 0.2), (0.5, 3.0)],
+)
+def test_motion_intervals_matches_frame_at_a_time(seed, gap_seconds, pad_seconds):
+    rng = np.random.default_rng(seed)
+    # Bursts of motion, so there are gaps either side of gap_seconds
+    scores = np.repeat(rng.random(60) < 0.3, rng.integers(1, 40, 60)) * 1.0
+    fps = 10.0
+    assert filter_to_motion.motion_intervals(
+        scores, fps, 0.5, gap_seconds, pad_seconds
+    ) == motion_intervals_reference(scores, fps, 0.5, gap_seconds, pad_seconds)
+
+
+def test_motion_intervals_gap_boundary():
+    # A gap of exactly gap_seconds is filled, any longer isn't
+    scores = np.zeros(100)
+    scores[10:20] = scores[40:50] = 1.0
+    assert filter_to_motion.motion_intervals(scores, 10.0, 0.5, 2.0, 0.0) == [(10, 50)]
+    assert filter_to_motion.motion_intervals(scores, 10.0, 0.5, 1.9, 0.0) == [
+        (10, 20),
+        (40, 50),
+    ]
+
+
+def test_motion_intervals_without_motion():
+    assert filter_to_motion.motion_intervals(np.zeros(100), 30.0, 0.5) == []
+
+
+def foreground_mask(rng, shape=(360, 640)):
+    # MOG2-like: white blobs, speckle noise the erode removes, grey shadows
+    mask = np.zeros(shape, np.uint8)
+    for _ in range(rng.integers(0, 4)):
+        center = (int(rng.integers(0, shape[1])), int(rng.integers(0, shape[0])))
+        axes = (int(rng.integers(5, 80)), int(rng.integers(5, 80)))
+        cv2.ellipse(mask, center, axes, float(rng.integers(0, 180)), 0, 360, 255, -1)
+    mask[rng.random(shape) < 0.01] = 255
+    mask[rng.random(shape) < 0.01] = 127
+    return mask
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_to_contours_fast_matches_to_contours(seed):
+    mask = foreground_mask(np.random.default_rng(seed))
+    reference = filter_to_motion.to_contours(mask)
+
+    assert np.array_equal(
+        filter_to_motion.to_contours_fast(mask, proxy_scale=1), reference
+    )
+
+    proxy_scale = 4
+    fast = filter_to_motion.to_contours_fast(mask, proxy_scale=proxy_scale)
+    assert fast.shape == reference.shape
+    # What CheckContours checks: the same frames have motion
+    assert filter_to_motion.is_frame_black(fast) == filter_to_motion.is_frame_black(
+        reference
+    )
+    # and the edges land within 2 * proxy_scale pixels of each other
+    near = filter_to_motion.square_kernel(4 * proxy_scale + 1)
+    assert not np.any((fast > 0) & (cv2.dilate(reference, near) == 0))
+    assert not np.any((reference > 0) & (cv2.dilate(fast, near) == 0))
+    union = np.count_nonzero(reference | fast)
+    if union:
+        assert np.count_nonzero(reference & fast) / union > 0.9
@@ -0,0 +1,92 @@
+# The vectorized pose metrics and rep segmentation against the per-frame
+# Body and SwingRepCounter they replaced, on synthetic keypoints, so a
+# change in rep counts or angles shows up here rather than in a video.
+
+import numpy as np
+import pytest
+
+import pose_cache
+
+# Needs torch and ultralytics
+pose_helper = pytest.importorskip("pose_helper")
+
+
+def swing_back_angles(rng, frames=2000):
+    # Runs of upright and hinged back angles, some shorter than the
+    # SwingRepCounter threshold, with frames nobody's in
+    back = []
+    while len(back) < frames:
+        hinge = rng.random() < 0.5
+        run = rng.integers(1, 12)
+        back += [rng.integers(0, 45) if hinge else rng.integers(45, 90)] * run
+    back = np.array(back[:frames], np.float64)
+    back[rng.random(frames) < 0.1] = np.nan
+    return back
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_segment_reps_counts_like_swing_rep_counter(seed):
+    rng = np.random.default_rng(seed)
+    back = swing_back_angles(rng)
+    frames = np.arange(len(back)) * 2  # sparse, like a strided pose cache
+    metrics = {"spine_vertical": back, "hip_angle": rng.integers(60, 180, len(back))}
+
+    counter = pose_helper.SwingRepCounter()
+    seen, confirmed_at = [], []
+    for frame, angle in zip(frames, back):
+        if np.isnan(angle):
+            continue
+        seen.append(frame)
+        rep = counter.rep
+        counter.frame(is_hinge=int(angle) < 45)
+        if counter.rep != rep:
+            confirmed_at.append(len(seen) - 1)
+
+    reps = pose_helper.segment_reps(metrics, frames, fps=30.0)
+    assert len(reps["rep"]) == counter.rep
+    # A rep starts on the first hinged frame, threshold - 1 before it counts
+    threshold = counter.transition_threshold
+    starts = [i - (threshold - 1) for i in confirmed_at]
+    # and runs up to the frame before the next one starts
+    ends = [start - 1 for start in starts[1:]] + [len(seen) - 1] * bool(starts)
+    assert reps["start_frame"].tolist() == [seen[i] for i in starts]
+    assert reps["end_frame"].tolist() == [seen[i] for i in ends]
+
+
+def body_reference(pose):
+    # What add_pose showed per frame, from a Body
+    body = pose_helper.Body(pose)
+    return {
+        "hip_angle": body.hip_angle(),
+        "armpit_angle": body.armpit_angle(),
+        "spine_vertical": body.spine_vertical(),
+        "neck_to_head": body.neck_to_head(),
+        "leg_lower_vertical": pose_helper.bone_to_vertical(body.r_leg_lower()),
+        "arm_horizontal": pose_helper.bone_to_horizontal(body.r_total_arm()),
+    }
+
+
+def test_body_metrics_matches_body():
+    rng = np.random.default_rng(0)
+    keypoints = rng.random((500, 17, 3)).astype(np.float32)
+    # Upright, hinged and bones pointing every which way
+    keypoints[:100, pose_helper.BodyPart.RIGHT_SHOULDER.value, :2] = (0.5, 0.2)
+    keypoints[:100, pose_helper.BodyPart.RIGHT_HIP.value, :2] = (0.5, 0.6)
+    keypoints[-5:] = np.nan  # nobody in frame
+
+    metrics = pose_helper.body_metrics(keypoints[..., :2])
+    for row in range(len(keypoints)):
+        expected = None
+        if not np.isnan(keypoints[row]).any():
+            expected = body_reference(
+                pose_cache.Pose(keypoints[row : row + 1], (720, 1280))
+            )
+        assert pose_helper.metrics_row(metrics, row) == expected, row
+
+
+def test_frame_metrics_matches_body():
+    rng = np.random.default_rng(1)
+    keypoints = rng.random((3, 17, 3)).astype(np.float32)
+    pose = pose_cache.Pose(keypoints, (720, 1280))
+    # First person, like the overlay
+    assert pose_helper.frame_metrics(pose) == body_reference(pose)
@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
 
 import cv2
-import pytesseract
+import collections
+import concurrent.futures
+import multiprocessing
+import json
+import shutil
+import time
 from PIL import Image
 import numpy as np
 from datetime import timedelta
@@ -15,6 +20,7 @@ from pathlib import Path
 
 app = typer.Typer()
 
+
 def timestamp_to_string(timestamp_ms):
     """Convert milliseconds to HH:MM:SS format"""
     td = timedelta(milliseconds=timestamp_ms)
@@ -23,37 +29,396 @@ def timestamp_to_string(timestamp_ms):
     seconds = td.seconds % 60
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
 
+
+def text_signature(gray, shrink=2):
+    """Smaller copy of the frame to cheaply tell if its text could have changed"""
+    # Relative to the source, not a fixed width, so a one character change
+    # is still a few pixels however big the video is. INTER_AREA averages
+    # away sensor noise.
+    return cv2.resize(
+        gray, None, fx=1 / shrink, fy=1 / shrink, interpolation=cv2.INTER_AREA
+    )
+
+
+def changed_fraction(signature, last_signature, level=25, tile=16):
+    """
+    Most any tile x tile block of the signature changed: the fraction of its
+    pixels that moved more than level gray levels. Per tile, as a whole
+    frame fraction waters down a changed word or digit to nothing.
+    """
+    changed = (cv2.absdiff(signature, last_signature) > level).view(np.uint8)
+    height, width = changed.shape
+    # PERF: count each tile from the corners of an integral image
+    sums = cv2.integral(changed)
+    rows, cols = np.r_[0:height:tile, height], np.r_[0:width:tile, width]
+    corners = sums[np.ix_(rows, cols)]
+    counts = corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+    # Edge tiles are only partly inside the signature
+    areas = np.outer(np.diff(rows), np.diff(cols))
+    return float((counts / areas).max())
+
+
+HOMEBREW_TESSERACT = "/opt/homebrew/bin/tesseract"
+
+
+def find_tesseract():
+    # Homebrew's bin isn't on PATH when launched from some Mac apps
+    tesseract = shutil.which("tesseract")
+    if tesseract:
+        return tesseract
+    if os.path.exists(HOMEBREW_TESSERACT):
+        return HOMEBREW_TESSERACT
+    raise FileNotFoundError(
+        "Can't find tesseract (brew install tesseract, apt install tesseract-ocr)"
+    )
+
+
+class PytesseractBackend:
+    """Runs the tesseract binary (with a temp image) for every call"""
+
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+
+        self.pytesseract = pytesseract
+        pytesseract.pytesseract.tesseract_cmd = find_tesseract()
+
+    def image_to_data(self, image):
+        return self.pytesseract.image_to_data(
+            image, output_type=self.pytesseract.Output.DICT
+        )
+
+
+class TesserocrBackend:
+    """
+    PERF: tesseract loaded in process once, so no process spawn, temp file
+    or model load per call. Same engine and page segmentation, so the same
+    words and confidences as pytesseract.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self):
+        import tesserocr
+
+        self.tesserocr = tesserocr
+        self.api = tesserocr.PyTessBaseAPI()
+
+    def image_to_data(self, image):
+        # Only the word level of what pytesseract returns, the rest of its
+        # rows have no text anyway
+        data = {
+            "conf": [],
+            "text": [],
+            "left": [],
+            "top": [],
+            "width": [],
+            "height": [],
+        }
+        self.api.SetImage(image)
+        self.api.Recognize()
+        iterator = self.api.GetIterator()
+        if iterator is None:
+            return data
+        level = self.tesserocr.RIL.WORD
+        for word in self.tesserocr.iterate_level(iterator, level):
+            data["text"].append(word.GetUTF8Text(level) or "")
+            data["conf"].append(word.Confidence(level))
+            left, top, right, bottom = word.BoundingBox(level)
+            data["left"].append(left)
+            data["top"].append(top)
+            data["width"].append(right - left)
+            data["height"].append(bottom - top)
+        return data
+
+
+ocr_backends = {
+    backend.name: backend for backend in [TesserocrBackend, PytesseractBackend]
+}
+
+
+def make_ocr_backend(name="auto"):
+    """auto is tesserocr if it's installed and starts up, else pytesseract"""
+    if name != "auto":
+        return ocr_backends[name]()
+    try:
+        return TesserocrBackend()
+    except ImportError:
+        return PytesseractBackend()
+    except RuntimeError as e:
+        # Installed but can't start, e.g. missing tessdata
+        ic(f"tesserocr failed to start, using pytesseract: {e}")
+        return PytesseractBackend()
+
+
+# This process's OCR engine, kept for the whole run
+ocr_backend = None
+
+
+def init_ocr(backend_name):
+    global ocr_backend
+    ocr_backend = make_ocr_backend(backend_name)
+    return ocr_backend
+
+
+def init_ocr_worker(backend_name):
+    # One tesseract per worker process, so keep it from also spreading
+    # itself over every core with OpenMP
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    init_ocr(backend_name)
+
+
+def threshold_for_ocr(gray):
+    # Apply inverted thresholding for white text on black background
+    return cv2.adaptiveThreshold(
+        gray,
+        255,
+        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV,  # White text on black background
+        11,
+        2,
+    )
+
+
+def ocr_words(thresh):
+    """[(text, (left, top, width, height))] of the confident, wordy text blocks"""
+    # Convert OpenCV image to PIL Image for Tesseract
+    pil_image = Image.fromarray(thresh)
+
+    # Get text and confidence data
+    data = ocr_backend.image_to_data(pil_image)
+
+    # Process all detected text blocks
+    text_blocks = []
+    for i, conf in enumerate(data["conf"]):
+        try:
+            conf_val = float(conf)
+            if conf_val > 25:  # Confidence threshold
+                text = data["text"][i].strip()
+                if text and sum(1 for c in text if c.isalpha()) >= 4:
+                    box = tuple(
+                        int(data[key][i]) for key in ("left", "top", "width", "height")
+                    )
+                    text_blocks.append((text, box))
+        except ValueError:
+            continue  # Skip invalid confidence values
+
+    return text_blocks
+
+
+def ocr_sample(images):
+    """(words, error) for grayscale images (crops), runs in the OCR workers"""
+    try:
+        return [ocr_words(threshold_for_ocr(image)) for image in images], None
+    except (cv2.error, OSError, RuntimeError, ValueError) as e:
+        return None, str(e)
+
+
+def parse_ocr_backend(name):
+    """auto or one of ocr_backends"""
+    choices = ["auto", *ocr_backends]
+    if name not in choices:
+        raise typer.BadParameter(f"{name} isn't one of {', '.join(choices)}")
+    return name
+
+
+def parse_roi(roi):
+    """'x,y,w,h' in source video pixels"""
+    try:
+        x, y, w, h = (int(v) for v in roi.split(","))
+    except ValueError:
+        raise typer.BadParameter(f"{roi} isn't x,y,w,h") from None
+    return x, y, w, h
+
+
+def words_bounding_roi(word_boxes, margin=16):
+    """One x,y,w,h around every word box, with some margin, None if no words"""
+    if not word_boxes:
+        return None
+    boxes = np.array(word_boxes)
+    x0, y0 = boxes[:, :2].min(axis=0) - margin
+    x1, y1 = (boxes[:, :2] + boxes[:, 2:]).max(axis=0) + margin
+    x0, y0 = max(0, x0), max(0, y0)
+    return int(x0), int(y0), int(x1 - x0), int(y1 - y0)
+
+
+def checkpoint_filename(output_file):
+    return f"{output_file}.checkpoint.json"
+
+
+def video_key(video_path):
+    """What a checkpoint has to match to resume on this video"""
+    stat = os.stat(video_path)
+    return {
+        "path": os.path.abspath(video_path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
 class TextDetector:
-    def __init__(self, frames_per_second=1, output_file=None):
+    def __init__(
+        self,
+        frames_per_second=1,
+        output_file=None,
+        change_threshold=0,
+        workers=1,
+        ocr_backend="auto",
+        rois=None,
+        learn_roi=0,
+        ocr_scale=1.0,
+        video_key=None,
+        resume=True,
+        checkpoint_seconds=5,
+    ):
         self.last_text = None
         self.frames_per_second = frames_per_second
         self.output_file = output_file
         self.output_fp = None
-        # Configure pytesseract path if needed
-        pytesseract.pytesseract.tesseract_cmd = '/opt/homebrew/bin/tesseract'
+        # PERF: skip OCR unless more than this fraction of some tile of the
+        # (downscaled) frame changed since the last frame we OCR'd, 0 (the
+        # default) to OCR every sample
+        self.change_threshold = change_threshold
+        self.last_signature = None
+        self.samples = 0
+        self.ocr_calls = 0
+        # PERF: tesseract is single threaded, so OCR samples in a process
+        # pool (1 is inline, 0 is one per core) and write results in order
+        self.workers = workers
+        self.pool = None
+        self.pending = collections.deque()  # (idx, origins, future) in frame order
+        self.ocr_backend = ocr_backend
+        # PERF: OCR only the regions (x, y, w, h) text shows up in, at
+        # ocr_scale. With learn_roi, OCR whole frames until that many have
+        # text, then keep to one region around all their words.
+        self.rois = list(rois or [])
+        self.learn_roi = learn_roi
+        self.learned_boxes = []
+        self.learned_samples = 0
+        self.ocr_scale = ocr_scale
+        # Every checkpoint_seconds, note the last sample that's been written
+        # (or skipped) and how far the output file got, so a rerun on the
+        # same video carries on from there instead of starting over
+        self.checkpoint_file = checkpoint_filename(output_file) if output_file else None
+        self.video_key = video_key
+        self.resume = resume
+        self.checkpoint_seconds = checkpoint_seconds
+        self.last_checkpoint = time.time()
 
     def create(self, input_video):
         """Initialize the processor with video properties"""
         self.fps = input_video.get(cv2.CAP_PROP_FPS)
         self.frame_count = 0
         # Calculate how many frames to skip to achieve desired frames_per_second
-        self.frame_skip = int(self.fps / self.frames_per_second)
-        ic(f"Video FPS: {self.fps}, Processing {self.frames_per_second} FPS, Skipping every {self.frame_skip} frames")
+        self.frame_skip = max(1, int(self.fps / self.frames_per_second))
+        # PERF: Let process_video skip decoding the frames we won't OCR
+        self.frame_stride = self.frame_skip
+        ic(
+            f"Video FPS: {self.fps}, Processing {self.frames_per_second} FPS, "
+            f"Skipping every {self.frame_skip} frames"
+        )
         # Create output directory if it doesn't exist
         if self.output_file:
             os.makedirs(os.path.dirname(self.output_file), exist_ok=True)
-            # Open output file in write mode
-            self.output_fp = open(self.output_file, 'w')
+            checkpoint = self.load_checkpoint()
+            if checkpoint:
+                # Drop anything written after the checkpoint, it gets redone
+                os.truncate(self.output_file, checkpoint["output_bytes"])
+                self.output_fp = open(self.output_file, "a")  # noqa: SIM115
+                self.last_text = checkpoint["last_text"]
+                self.rois = [tuple(roi) for roi in checkpoint["rois"]] or self.rois
+                # process_video reads on from wherever the video is
+                input_video.set(cv2.CAP_PROP_POS_FRAMES, checkpoint["frame"] + 1)
+                ic(f"Resuming after frame {checkpoint['frame']}")
+            else:
+                # Open output file in write mode
+                self.output_fp = open(self.output_file, "w")  # noqa: SIM115
+        ic(self.rois, self.ocr_scale)
+        # Pick the backend here, so workers all get the same one and a
+        # missing tesseract fails before any decoding
+        self.ocr_backend = init_ocr(self.ocr_backend).name
+        ic(self.ocr_backend)
+        if self.workers != 1:
+            workers = self.workers or os.cpu_count()
+            self.max_pending = 4 * workers
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_ocr_worker,
+                initargs=(self.ocr_backend,),
+            )
 
     def destroy(self):
         """Cleanup resources"""
+        self.drain(0)
+        if self.pool:
+            self.pool.shutdown()
+        ic(self.samples, self.ocr_calls)
         cv2.destroyAllWindows()
         if self.output_fp:
             self.output_fp.close()
 
+    def load_checkpoint(self):
+        """The checkpoint to resume from, None to start over"""
+        if not (self.resume and os.path.exists(self.checkpoint_file)):
+            return None
+        with open(self.checkpoint_file) as f:
+            checkpoint = json.load(f)
+        if (
+            checkpoint["complete"]
+            or checkpoint["video"] != self.video_key
+            or not os.path.exists(self.output_file)
+            or os.path.getsize(self.output_file) < checkpoint["output_bytes"]
+        ):
+            return None
+        return checkpoint
+
+    def save_checkpoint(self, idx, complete=False):
+        if not self.checkpoint_file:
+            return
+        if (
+            not complete
+            and time.time() - self.last_checkpoint < self.checkpoint_seconds
+        ):
+            return
+        self.last_checkpoint = time.time()
+        checkpoint = {
+            "video": self.video_key,
+            "frame": idx,
+            "last_text": self.last_text,
+            "rois": self.rois,
+            "output_bytes": os.path.getsize(self.output_file),
+            "complete": complete,
+        }
+        cv_helper.atomic_write_json(self.checkpoint_file, checkpoint)
+
+    def complete(self):
+        """Call once the whole video is done, so the next run starts over"""
+        self.save_checkpoint(self.frame_count, complete=True)
+
     def normalize_text(self, text):
         """Normalize text for comparison by removing extra spaces and lowercasing"""
-        return ' '.join(text.lower().split())
+        return " ".join(text.lower().split())
+
+    def regions(self, gray):
+        """(x, y, gray crop) for each region to OCR, whole frame if there are none"""
+        if not self.rois:
+            return [(0, 0, gray)]
+        crops = [(x, y, gray[y : y + h, x : x + w]) for x, y, w, h in self.rois]
+        return [crop for crop in crops if crop[2].size]
+
+    def scaled(self, crop):
+        if self.ocr_scale == 1.0:
+            return crop
+        interpolation = cv2.INTER_AREA if self.ocr_scale < 1 else cv2.INTER_CUBIC
+        return cv2.resize(
+            crop,
+            None,
+            fx=self.ocr_scale,
+            fy=self.ocr_scale,
+            interpolation=interpolation,
+        )
 
     def frame(self, idx, frame):
         """Process a single frame"""
@@ -63,63 +428,138 @@ class TextDetector:
         if idx % self.frame_skip == 0:
             # Convert frame to grayscale
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Apply inverted thresholding for white text on black background
-            thresh = cv2.adaptiveThreshold(
-                gray,
-                255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV,  # White text on black background
-                11,
-                2
-            )
+            self.samples += 1
+            if self.pool and self.learn_roi and not self.rois:
+                # Still learning, so which regions this sample gets depends
+                # on every earlier result. Wait for them, or how many more
+                # whole frames get OCR'd would come down to timing.
+                self.drain(0)
+            regions = self.regions(gray)
+
+            # Same picture as the last OCR means the same text, which was
+            # either already written or empty
+            signature = [text_signature(crop) for _, _, crop in regions]
+            if (
+                self.change_threshold > 0
+                and self.last_signature is not None
+                and [s.shape for s in signature]
+                == [s.shape for s in self.last_signature]
+                and all(
+                    changed_fraction(s, last) <= self.change_threshold
+                    for s, last in zip(signature, self.last_signature)
+                )
+            ):
+                # Nothing before it is still being OCR'd, so it's done with
+                if not self.pending:
+                    self.save_checkpoint(idx)
+                return
+
+            self.ocr_calls += 1
+            self.last_signature = signature
+            origins = [(x, y) for x, y, _ in regions]
+            images = [self.scaled(crop) for _, _, crop in regions]
+            if not self.pool:
+                self.write_text(idx, origins, *ocr_sample(images))
+                return
+            self.pending.append((idx, origins, self.pool.submit(ocr_sample, images)))
+            # Don't let decode run too far ahead of OCR
+            self.drain(self.max_pending)
+
+    def drain(self, max_pending):
+        # Write finished OCR in frame order, waiting on the oldest while
+        # there are more than max_pending in flight
+        while self.pending and (
+            self.pending[0][-1].done() or len(self.pending) > max_pending
+        ):
+            idx, origins, future = self.pending.popleft()
+            self.write_text(idx, origins, *future.result())
+
+    def learn(self, origins, words):
+        # Word boxes back in source video pixels
+        scale = self.ocr_scale
+        boxes = [
+            (x + left / scale, y + top / scale, w / scale, h / scale)
+            for (x, y), region in zip(origins, words)
+            for _, (left, top, w, h) in region
+        ]
+        if not boxes:
+            return
+        self.learned_boxes += boxes
+        self.learned_samples += 1
+        if self.learned_samples >= self.learn_roi:
+            self.rois = [words_bounding_roi(self.learned_boxes)]
+            ic(self.rois)
+
+    def write_text(self, idx, origins, words, error):
+        self.output_text(idx, origins, words, error)
+        # Results come through in frame order, so everything up to idx is done
+        self.save_checkpoint(idx)
+
+    def output_text(self, idx, origins, words, error):
+        if error is not None:
+            print(f"Error processing frame {idx}: {error}", file=sys.stderr)
+            return
+        if self.learn_roi and not self.rois:
+            self.learn(origins, words)
+
+        # Combine text blocks
+        text = " ".join(text for region in words for text, _ in region).strip()
+
+        # Only output if text is found and different from last text
+        if text:
+            normalized_text = self.normalize_text(text)
+            if not self.last_text or normalized_text != self.normalize_text(
+                self.last_text
+            ):
+                timestamp_ms = (idx / self.fps) * 1000
+                output_line = f"{timestamp_to_string(timestamp_ms)} -> {text}\n"
+                if self.output_fp:
+                    self.output_fp.write(output_line)
+                    self.output_fp.flush()
+                else:
+                    print(output_line, end="")
+                self.last_text = text
 
-            # Convert OpenCV image to PIL Image for Tesseract
-            pil_image = Image.fromarray(thresh)
-
-            try:
-                # Get text and confidence data
-                data = pytesseract.image_to_data(pil_image, output_type=pytesseract.Output.DICT)
-                
-                # Process all detected text blocks
-                text_blocks = []
-                for i, conf in enumerate(data['conf']):
-                    try:
-                        conf_val = float(conf)
-                        if conf_val > 25:  # Confidence threshold
-                            text = data['text'][i].strip()
-                            if text and sum(1 for c in text if c.isalpha()) >= 4:
-                                text_blocks.append(text)
-                    except ValueError:
-                        continue  # Skip invalid confidence values
-                
-                # Combine text blocks
-                text = ' '.join(text_blocks).strip()
-                
-                # Only output if text is found and different from last text
-                if text:
-                    normalized_text = self.normalize_text(text)
-                    if not self.last_text or normalized_text != self.normalize_text(self.last_text):
-                        timestamp_ms = (idx / self.fps) * 1000
-                        output_line = f"{timestamp_to_string(timestamp_ms)} -> {text}\n"
-                        if self.output_fp:
-                            self.output_fp.write(output_line)
-                            self.output_fp.flush()
-                        else:
-                            print(output_line, end='')
-                        self.last_text = text
-
-            except Exception as e:
-                print(f"Error processing frame {idx}: {e}", file=sys.stderr)
 
 @app.command()
 def process_video(
-    video_path: str = typer.Argument("input.mp4", help="Path to the video file to process"),
-    fps: float = typer.Option(1/3, help="Number of frames to process per second"),
+    video_path: str = typer.Argument(
+        "input.mp4", help="Path to the video file to process"
+    ),
+    fps: float = typer.Option(1 / 3, help="Number of frames to process per second"),
     output_file: str = typer.Option(
         os.path.expanduser("~/tmp/timecode.txt"),
-        help="Path to output file (default: ~/tmp/timecode.txt)"
-    )
+        help="Path to output file (default: ~/tmp/timecode.txt)",
+    ),
+    seek: bool = typer.Option(
+        False, help="Seek between sampled frames instead of grabbing every frame"
+    ),
+    change_threshold: float = typer.Option(
+        0,
+        help="Only OCR a sample if more than this fraction of any 32px tile changed "
+        "since the last OCR (e.g. 0.005), 0 to OCR every sample",
+    ),
+    workers: int = typer.Option(
+        1, help="OCR processes, 1 to OCR inline, 0 for one per core"
+    ),
+    ocr_backend: str = typer.Option(
+        "auto",
+        help="auto, tesserocr (in process) or pytesseract (runs tesseract per frame)",
+    ),
+    roi: list[str] = typer.Option(
+        [], help="Only OCR this x,y,w,h region of the video, can be repeated"
+    ),
+    learn_roi: int = typer.Option(
+        0,
+        help="OCR whole frames until this many have text, "
+        "then only the region their words were in",
+    ),
+    ocr_scale: float = typer.Option(
+        1.0, help="Resize regions by this much before OCR, e.g. 0.5 for 4K"
+    ),
+    resume: bool = typer.Option(
+        True, help="Carry on from where an interrupted run on this video left off"
+    ),
 ):
     """
     Process a video file and extract text with timestamps.
@@ -127,10 +567,24 @@ def process_video(
     """
     ic(f"Processing video for text: {video_path}")
     ic(f"Output file: {output_file}")
-    
+
     input_video = cv_helper.cv2_video(video_path)
-    detector = TextDetector(frames_per_second=fps, output_file=output_file)
-    cv_helper.process_video(input_video, detector)
+    detector = TextDetector(
+        frames_per_second=fps,
+        output_file=output_file,
+        change_threshold=change_threshold,
+        workers=workers,
+        ocr_backend=parse_ocr_backend(ocr_backend),
+        rois=[parse_roi(r) for r in roi],
+        learn_roi=learn_roi,
+        ocr_scale=ocr_scale,
+        video_key=video_key(video_path),
+        resume=resume,
+    )
+    cv_helper.process_video(input_video, detector, seek=seek)
+    # Not in destroy, that runs on the way out of a crash too
+    detector.complete()
+
 
 if __name__ == "__main__":
-    app() 
\ No newline at end of file
+    app()
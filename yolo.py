@@ -25,16 +25,20 @@ import cv2
 import typer
 import os.path
 import pose_helper
-from typing import List
+import pose_cache
 import pickle
 from pathlib import Path
 from pydantic import BaseModel
 import datetime
+import collections
+import functools
+import itertools
 import os
 import json
 from rich.console import Console
 from rich.prompt import Confirm
 import subprocess
+import numpy as np
 
 console = Console()
 
@@ -43,13 +47,24 @@ app = typer.Typer(no_args_is_help=True)
 # YOLO model path constant
 YOLO_POSE_MODEL = "yolo11n-pose.pt"
 
+# Rows of the pose cache SwingsProcessor works out angles for at a time
+METRICS_CHUNK_ROWS = 1024
+
 
 class YoloResult(BaseModel):
-    keypoints: List
+    keypoints: list
 
     @classmethod
     def from_predict(cls, yolo_result):
-        return YoloResult(keypoints=yolo_result[0].keypoints)
+        return cls.from_result(yolo_result[0])
+
+    @classmethod
+    def from_result(cls, result):
+        return cls.from_keypoints(result.keypoints)
+
+    @classmethod
+    def from_keypoints(cls, keypoints):
+        return YoloResult(keypoints=keypoints)
 
 
 class YoloFrame(BaseModel):
@@ -58,18 +73,28 @@ class YoloFrame(BaseModel):
 
 
 class CaptureYoloData:
-    def __init__(self, pickle_path: Path):
-        self.yolo_frames: List[YoloFrame] = []
-        self.pickle_path = pickle_path
+    def __init__(self, cache_path: Path | None, batch_size: int = 1):
+        self.yolo_frames: list[YoloFrame] = []
+        self.cache_path = cache_path
+        # PERF: predict() on a batch of frames pays the preprocessing and
+        # dispatch overhead once per batch instead of once per frame
+        self.batch_size = batch_size
+        self.pending_frames = []
 
     def create(self, input_video):
         # self.yolo = YOLO('yolov8n-seg.pt')  # pretrained YOLOv8n model
         self.yolo = YOLO(YOLO_POSE_MODEL)  # pretrained YOLOv8n model
+        self.fps = input_video.get(cv2.CAP_PROP_FPS)
 
     def destroy(self):
-        # write to gz file
-        with open(self.pickle_path, "wb") as f:
-            pickle.dump(self.yolo_frames, f)
+        self.flush()
+        # Shards don't write, their frames are joined by the caller
+        if self.cache_path is None:
+            return
+        pose_cache.save_yolo_frames(self.cache_path, self.yolo_frames, self.fps)
+
+    def shard_result(self):
+        return self.yolo_frames
 
     def frame(self, idx, frame):
         # results don't move so frequently that we need to re-yolo
@@ -78,19 +103,125 @@ class CaptureYoloData:
         # if idx % 15 != 0:
         # return
 
-        results = self.yolo.predict(frame, verbose=False)
-        if not results:
+        self.pending_frames.append((idx, frame))
+        if len(self.pending_frames) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending_frames:
             return
+        indices, frames = zip(*self.pending_frames)
+        self.pending_frames = []
+        # One result per frame, in the order the frames were passed
+        results = self.yolo.predict(list(frames), verbose=False)
+        for idx, result in zip(indices, results):
+            self.yolo_frames.append(
+                YoloFrame(frame=idx, yolo_results=YoloResult.from_result(result))
+            )
+
+
+class AdaptiveCaptureYoloData(CaptureYoloData):
+    """
+    Run pose every base_stride frames, and densify (by bisection) only where
+    keypoints moved more than motion_threshold between samples, e.g. the
+    swing apex and the hinge. Frames that skip YOLO get keypoints
+    interpolated from the samples either side, so there's still a YoloFrame
+    for every frame. Each round of bisection goes to YOLO in batches of
+    batch_size.
+    """
+
+    def __init__(
+        self,
+        cache_path: Path | None,
+        base_stride: int = 8,
+        motion_threshold: float = 0.02,
+        batch_size: int = 1,
+    ):
+        super().__init__(cache_path, batch_size=batch_size)
+        self.base_stride = base_stride
+        self.motion_threshold = motion_threshold
+        self.window = {}  # idx -> frame, for the frames since the last sample
+        self.last_sample = None  # (idx, keypoints)
+        self.frames_predicted = 0
+        self.frames_seen = 0
+
+    def destroy(self):
+        super().destroy()
+        ic(self.frames_seen, self.frames_predicted)
+
+    def predict(self, frames):
+        """Keypoints for each of frames"""
+        keypoints = []
+        for start in range(0, len(frames), self.batch_size):
+            batch = frames[start : start + self.batch_size]
+            self.frames_predicted += len(batch)
+            results = self.yolo.predict(batch, verbose=False)
+            keypoints += [result.keypoints for result in results]
+        return keypoints
+
+    def append(self, idx, keypoints):
         self.yolo_frames.append(
-            YoloFrame(frame=idx, yolo_results=YoloResult.from_predict(results))
+            YoloFrame(frame=idx, yolo_results=YoloResult.from_keypoints(keypoints))
         )
 
+    def frame(self, idx, frame):
+        self.frames_seen += 1
+        if self.last_sample is None:
+            self.last_sample = (idx, self.predict([frame])[0])
+            self.append(*self.last_sample)
+            return
+
+        self.window[idx] = frame
+        if idx - self.last_sample[0] >= self.base_stride:
+            self.flush()
+
+    def flush(self):
+        # Sample the newest frame, then fill in back to the previous sample
+        if not self.window:
+            return
+        idx = max(self.window)
+        sample = (idx, self.predict([self.window[idx]])[0])
+        self.fill(self.last_sample, sample)
+        self.append(*sample)
+        self.last_sample = sample
+        self.window = {}
+
+    def fill(self, start, end):
+        # Bisect a round at a time, so each round's midpoints are one batch
+        samples = dict([start, end])
+        spans = [(start[0], end[0])]
+        while spans:
+            spans = [
+                (a, b)
+                for a, b in spans
+                if b - a > 1
+                and pose_helper.keypoint_motion(samples[a], samples[b])
+                > self.motion_threshold
+            ]
+            mids = [(a + b) // 2 for a, b in spans]
+            samples.update(zip(mids, self.predict([self.window[m] for m in mids])))
+            spans = [
+                span for (a, b), m in zip(spans, mids) for span in ((a, m), (m, b))
+            ]
+
+        # Everything between start and end, sampled or interpolated
+        sampled = sorted(samples)
+        for a, b in itertools.pairwise(sampled):
+            for idx in range(a + 1, b):
+                t = (idx - a) / (b - a)
+                self.append(
+                    idx,
+                    pose_helper.interpolate_keypoints(samples[a], samples[b], t),
+                )
+            if b != end[0]:
+                self.append(b, samples[b])
+
 
 class SwingsProcessor:
     def __init__(
         self,
         base_filename,
-        yolo_frames_path: Path,
+        poses: pose_cache.PoseCache,
         label: str,
         body_part_display_seconds: int,
     ):
@@ -98,18 +229,26 @@ class SwingsProcessor:
         self.label = label
         self.body_part_display_seconds = body_part_display_seconds
         self.current_frame = 0
-        with open(yolo_frames_path, "rb") as f:
-            self.yolo_frames = pickle.load(f)
+        self.poses = poses
+        # Angles for a chunk of rows at a time, rather than a Body per frame,
+        # for everyone in the frame since each athlete counts their own reps.
+        # Chunks, not the whole session, so start-up stays instant and memory
+        # doesn't grow with the session (the keypoints are memory-mapped).
+        self.rep_counters = collections.defaultdict(pose_helper.SwingRepCounter)
+        self.metrics = None
+        self.metrics_start = None
+        self.athlete = None
+        if poses is not None:
+            # The overlay follows whoever is in the most frames
+            athletes = poses.athletes()
+            self.athlete = athletes[0] if athletes else None
 
     def create(self, input_video):
         self.video = input_video
         self.fps = input_video.get(cv2.CAP_PROP_FPS)
-        # self.yolo = YOLO('yolov8n-seg.pt')  # pretrained YOLOv8n model
-        self.yolo = YOLO(YOLO_POSE_MODEL)  # pretrained YOLOv8n model
         self.yolo_filename = f"{self.base_filename}.mp4"
         self.yolo_writer = cv_helper.LazyVideoWriter(self.yolo_filename, self.fps)
         self.output_video_files = [self.yolo_writer]
-        self.rep_counter = pose_helper.SwingRepCounter()
 
     def destroy(self):
         cv2.destroyAllWindows()
@@ -124,9 +263,42 @@ class SwingsProcessor:
         # on each frame, so just do every 500ms
 
         # if idx % self.update_freq != 0:
-        self.results = self.yolo_frames[idx].yolo_results.keypoints[0]
+        row = self.poses.row(idx)
+        people = range(self.poses.person_count[row]) if row is not None else []
+        if people:
+            metrics, chunk_row = self.metrics_chunk(row)
+        athletes = {
+            int(self.poses.track_ids[row, person]): pose_helper.metrics_row(
+                metrics, (chunk_row, person)
+            )
+            for person in people
+        }
+        self.count_reps(athletes)
+        self.render(
+            idx,
+            frame,
+            self.poses.athlete_pose(idx, self.athlete),
+            athletes.get(self.athlete),
+        )
+
+    def metrics_chunk(self, row: int):
+        """(body_metrics of the chunk row is in, row within it)"""
+        start = row - row % METRICS_CHUNK_ROWS
+        if start != self.metrics_start:
+            keypoints = self.poses.keypoints[start : start + METRICS_CHUNK_ROWS]
+            self.metrics = pose_helper.body_metrics(keypoints[..., :2])
+            self.metrics_start = start
+        return self.metrics, row - start
 
-        if not self.results:
+    def count_reps(self, athletes):
+        # track id -> metrics for everyone in this frame
+        for track_id, metrics in athletes.items():
+            self.rep_counters[track_id].frame(is_hinge=metrics["spine_vertical"] < 45)
+
+    def render(self, idx, frame, pose, metrics=None):
+        self.results = pose
+
+        if self.results is None:
             # no frame to process
             return
 
@@ -137,9 +309,8 @@ class SwingsProcessor:
                 ic(idx)
 
         base_image = frame  # self.results[0].plot()
-        self.rep_counter.frame(
-            is_hinge=pose_helper.Body(self.results).spine_vertical() < 45
-        )
+        if metrics is None:
+            metrics = pose_helper.frame_metrics(self.results)
 
         # Calculate if body parts should be visible based on frame number and fps
         show_body_parts = True
@@ -150,32 +321,161 @@ class SwingsProcessor:
             keypoints=self.results,
             im=base_image,
             frame=idx,
-            rep=self.rep_counter.rep,
+            rep=self.rep_counters[self.athlete].rep,
             label=self.label,
             show_body_parts=show_body_parts,
+            metrics=metrics,
         )
         self.yolo_writer.write(base_image)
 
 
-def process_video(video_input_file: str) -> List[YoloFrame]:
-    """Process a video file with YOLO and return the frames data."""
+class CaptureSwingsProcessor(SwingsProcessor):
+    """
+    SwingsProcessor for when there's no pose cache yet: run pose on each
+    frame as it's decoded and render it once its keypoints are in, so the
+    video is only decoded once. The capture still writes the pose cache for
+    later re-renders.
+
+    The overlay follows whoever is in the most frames so far, the cached
+    render follows whoever is in the most frames overall. Those only differ
+    if the lead changed hands, see athlete_changed().
+    """
+
+    def __init__(
+        self,
+        base_filename,
+        capture: CaptureYoloData,
+        label: str,
+        body_part_display_seconds: int,
+    ):
+        super().__init__(base_filename, None, label, body_part_display_seconds)
+        self.capture = capture
+        # Frames waiting on pose, batching and adaptive sampling both lag
+        self.pending = collections.deque()
+        self.rendered = 0
+        # Same ids the pose cache will get, it runs the same tracker
+        self.tracker = pose_cache.PoseTracker()
+        # Who the overlay followed, over the frames with anyone in them
+        self.athletes_rendered = set()
+
+    def create(self, input_video):
+        super().create(input_video)
+        self.capture.create(input_video)
+
+    def destroy(self):
+        self.capture.flush()
+        self.render_captured()
+        self.capture.destroy()
+        super().destroy()
+
+    def frame(self, idx, frame):
+        self.current_frame = idx
+        self.pending.append((idx, frame))
+        self.capture.frame(idx, frame)
+        self.render_captured()
+
+    def render_captured(self):
+        # Captures append yolo_frames in frame order, one per frame
+        yolo_frames = self.capture.yolo_frames
+        while self.rendered < len(yolo_frames):
+            yolo_frame = yolo_frames[self.rendered]
+            self.rendered += 1
+            idx, frame = self.pending.popleft()
+            assert idx == yolo_frame.frame, (idx, yolo_frame.frame)
+            keypoints = yolo_frame.yolo_results.keypoints
+            people = pose_cache.keypoints_to_array(keypoints)
+            track_ids = self.tracker.update(people, idx).tolist()
+            poses = {
+                track_id: pose_cache.Pose(
+                    people[person : person + 1], keypoints.orig_shape
+                )
+                for person, track_id in enumerate(track_ids)
+            }
+            athletes = {
+                track_id: pose_helper.frame_metrics(pose)
+                for track_id, pose in poses.items()
+            }
+            self.count_reps(athletes)
+            self.athlete = self.tracker.main_track()
+            if poses:
+                self.athletes_rendered.add(self.athlete)
+            self.render(idx, frame, poses.get(self.athlete), athletes.get(self.athlete))
+
+    def athlete_changed(self) -> bool:
+        """True if some frames followed someone other than the main athlete"""
+        return bool(self.athletes_rendered - {self.tracker.main_track()})
+
+
+def pose_cache_filename(base_filename: str) -> str:
+    return f"output/{base_filename}-pose.npz"
+
+
+def video_fps(video_input_file: str) -> float:
+    video = cv_helper.cv2_video(video_input_file)
+    fps = video.get(cv2.CAP_PROP_FPS)
+    video.release()
+    return fps
+
+
+def make_capture(
+    cache_path: Path | None,
+    batch_size: int = 1,
+    pose_stride: int = 1,
+    pose_motion_threshold: float = 0.02,
+) -> CaptureYoloData:
+    if pose_stride > 1:
+        return AdaptiveCaptureYoloData(
+            cache_path,
+            base_stride=pose_stride,
+            motion_threshold=pose_motion_threshold,
+            batch_size=batch_size,
+        )
+    return CaptureYoloData(cache_path, batch_size=batch_size)
+
+
+def capture_yolo_shard(capture_options, shard: cv_helper.Shard) -> CaptureYoloData:
+    return make_capture(None, **capture_options)
+
+
+def process_video(
+    video_input_file: str,
+    shards: int = 1,
+    batch_size: int = 1,
+    pose_stride: int = 1,
+    pose_motion_threshold: float = 0.02,
+) -> list[YoloFrame]:
+    """Process a video file with YOLO, save the pose cache and return the frames data."""
+    base_filename = os.path.splitext(os.path.basename(video_input_file))[0]
+    path = Path(pose_cache_filename(base_filename))
+    capture_options = {
+        "batch_size": batch_size,
+        "pose_stride": pose_stride,
+        "pose_motion_threshold": pose_motion_threshold,
+    }
+    if shards != 1:
+        # Pose has no history, so shards need no warm-up frames
+        shard_frames = cv_helper.process_video_sharded(
+            video_input_file,
+            functools.partial(capture_yolo_shard, capture_options),
+            shards=shards,
+        )
+        yolo_frames = [frame for frames in shard_frames for frame in frames]
+        fps = video_fps(video_input_file)
+        pose_cache.save_yolo_frames(path, yolo_frames, fps)
+        return yolo_frames
+
     input_video = cv2.VideoCapture(video_input_file)
     if not input_video.isOpened():
         raise Exception(f"Unable to Open {video_input_file}")
 
-    # Get directory and base filename separately
-    base_name = os.path.basename(video_input_file)
-    base_filename = os.path.splitext(base_name)[0]
-    yolo_data_path = f"output/{base_filename}-yolo.pickle.gz"
-    path = Path(yolo_data_path)
-    capture = CaptureYoloData(path)
+    capture = make_capture(path, **capture_options)
     cv_helper.process_video(input_video, capture)
     return capture.yolo_frames
 
 def process_video_with_yolo(
     video_input_file: str,
     output_file: str,
-    yolo_data: List[YoloFrame],
+    yolo_data: pose_cache.PoseCache,
     label: bool,
     body_part_seconds: float,
 ):
@@ -184,19 +484,197 @@ def process_video_with_yolo(
     if not input_video.isOpened():
         raise Exception(f"Unable to Open {video_input_file}")
 
-    # Get directory and base filename separately
-    base_name = os.path.basename(video_input_file)
-    base_filename = os.path.splitext(base_name)[0]
-    yolo_data_path = f"output/{base_filename}-yolo.pickle.gz"
-    pickle_path = Path(yolo_data_path)
-
     processor = SwingsProcessor(
         base_filename=output_file.replace('.mp4', ''),
-        yolo_frames_path=pickle_path,
+        poses=yolo_data,
+        label=str(datetime.datetime.now().strftime("%Y-%m-%d")) if label else "",
+        body_part_display_seconds=body_part_seconds,
+    )
+    cv_helper.process_video(input_video, processor)
+
+
+def process_video_capturing_yolo(
+    video_input_file: str,
+    output_file: str,
+    label: bool,
+    body_part_seconds: float,
+    batch_size: int = 1,
+    pose_stride: int = 1,
+    pose_motion_threshold: float = 0.02,
+):
+    """Run YOLO and render the output in one decode, saving the pose cache too."""
+    input_video = cv_helper.cv2_video(video_input_file)
+
+    base_filename = os.path.splitext(os.path.basename(video_input_file))[0]
+    cache_path = Path(pose_cache_filename(base_filename))
+    capture = make_capture(
+        cache_path,
+        batch_size=batch_size,
+        pose_stride=pose_stride,
+        pose_motion_threshold=pose_motion_threshold,
+    )
+    processor = CaptureSwingsProcessor(
+        base_filename=output_file.replace(".mp4", ""),
+        capture=capture,
         label=str(datetime.datetime.now().strftime("%Y-%m-%d")) if label else "",
         body_part_display_seconds=body_part_seconds,
     )
     cv_helper.process_video(input_video, processor)
+    if processor.athlete_changed():
+        # Render again from the pose cache, so the video is the same as a
+        # warm cache run would give
+        console.print(
+            "[yellow]Main athlete changed partway through, re-rendering[/yellow]"
+        )
+        process_video_with_yolo(
+            video_input_file,
+            output_file,
+            pose_cache.PoseCache(cache_path),
+            label=label,
+            body_part_seconds=body_part_seconds,
+        )
+
+
+def reps_filename(pose_cache_file: str, extension: str) -> str:
+    return (
+        pose_cache_file.removesuffix(".npz").removesuffix("-pose")
+        + f"-reps.{extension}"
+    )
+
+
+@app.command()
+def reps(
+    pose_cache_files: list[str] = typer.Argument(
+        help="Pose caches (output/<name>-pose.npz) to segment into reps"
+    ),
+    extension: str = typer.Option("csv", "--format", help="csv or parquet"),
+):
+    """Write a rep table next to each pose cache, no video needed."""
+    for pose_cache_file in pose_cache_files:
+        poses = pose_cache.PoseCache(pose_cache_file)
+        _, table = athlete_tables(poses)
+        output_file = reps_filename(pose_cache_file, extension)
+        pose_helper.save_table(output_file, table)
+        console.print(f"{len(table['rep'])} reps in {pose_cache_file} -> {output_file}")
+
+
+def athletes_metrics(poses: pose_cache.PoseCache, athletes: list[int]) -> dict:
+    """
+    athlete_metrics for each of athletes, by athlete. Angles are worked out
+    METRICS_CHUNK_ROWS rows at a time like SwingsProcessor, so memory doesn't
+    grow with everyone in every frame of the session.
+    """
+    chunks = {athlete: collections.defaultdict(list) for athlete in athletes}
+    # At least one (maybe empty) chunk, so there are columns with no frames
+    for start in range(0, max(1, len(poses)), METRICS_CHUNK_ROWS):
+        rows = slice(start, start + METRICS_CHUNK_ROWS)
+        metrics = pose_helper.body_metrics(poses.keypoints[rows, ..., :2])
+        for athlete in athletes:
+            athlete_metrics = pose_helper.athlete_metrics(
+                metrics, poses.track_ids[rows], athlete
+            )
+            for name, column in athlete_metrics.items():
+                chunks[athlete][name].append(column)
+    return {
+        athlete: {name: np.concatenate(columns) for name, columns in by_name.items()}
+        for athlete, by_name in chunks.items()
+    }
+
+
+def athlete_tables(poses: pose_cache.PoseCache):
+    """(per frame metrics, reps) tables for every tracked athlete, by athlete"""
+    metrics_tables, rep_tables = [], []
+    # -1 is the track id of padding, which is all NaN, so with nobody
+    # tracked the tables still get written, just empty
+    athletes = poses.athletes() or [-1]
+    for athlete, athlete_metrics in athletes_metrics(poses, athletes).items():
+        for tables, table in (
+            (metrics_tables, frame_metrics_table(poses, athlete_metrics)),
+            (
+                rep_tables,
+                pose_helper.segment_reps(athlete_metrics, poses.frames, poses.fps),
+            ),
+        ):
+            rows = len(next(iter(table.values())))
+            tables.append({"athlete": np.full(rows, athlete), **table})
+
+    def concat(tables):
+        return {name: np.concatenate([t[name] for t in tables]) for name in tables[0]}
+
+    return concat(metrics_tables), concat(rep_tables)
+
+
+def frame_metrics_table(poses: pose_cache.PoseCache, metrics: dict) -> dict:
+    # Only the frames with someone in them, like the rendered video
+    rows = ~np.isnan(metrics["spine_vertical"])
+    table = {
+        "frame": poses.frames[rows],
+        "seconds": poses.frames[rows] / poses.fps,
+    }
+    for name, column in metrics.items():
+        table[name] = column[rows].astype(np.int64)
+    return table
+
+
+def rep_summary(poses: pose_cache.PoseCache, reps: dict) -> dict:
+    # Stats are for the main athlete, the one in the most frames
+    athletes = poses.athletes()
+    athlete = athletes[0] if athletes else None
+    main = reps["athlete"] == athlete
+    return {
+        "fps": poses.fps,
+        "frames": len(poses),
+        "frames_with_person": int(np.count_nonzero(poses.person_count)),
+        "athlete": athlete,
+        "reps": int(main.sum()),
+        "mean_rep_seconds": (
+            float(reps["duration_seconds"][main].mean()) if main.any() else None
+        ),
+        "min_hip_angle": (
+            int(reps["min_hip_angle"][main].min()) if main.any() else None
+        ),
+        "max_back_angle": (
+            int(reps["max_back_angle"][main].max()) if main.any() else None
+        ),
+        "reps_by_athlete": {
+            str(a): int(np.count_nonzero(reps["athlete"] == a)) for a in athletes
+        },
+    }
+
+
+@app.command()
+def analyze(
+    video_input_file: str = typer.Argument(help="Input video file to analyze"),
+    shards: int = typer.Option(
+        1, help="If there's no pose cache, capture across this many processes"
+    ),
+    batch_size: int = typer.Option(8, help="Frames per YOLO predict call"),
+):
+    """
+    Rep counts and form metrics from the pose cache alone, no video is
+    rendered (or even opened if the pose cache exists).
+    """
+    base_filename = os.path.splitext(os.path.basename(video_input_file))[0]
+    os.makedirs("output", exist_ok=True)
+    yolo_data_file = pose_cache_filename(base_filename)
+    if not os.path.exists(yolo_data_file):
+        console.print("[yellow]Generating new YOLO data[/yellow]")
+        process_video(video_input_file, shards=shards, batch_size=batch_size)
+
+    poses = pose_cache.PoseCache(yolo_data_file)
+    metrics_table, reps_table = athlete_tables(poses)
+    summary = rep_summary(poses, reps_table)
+
+    metrics_file = f"output/{base_filename}-metrics.csv"
+    reps_file = reps_filename(yolo_data_file, "csv")
+    summary_file = f"output/{base_filename}-summary.json"
+    pose_helper.save_table(metrics_file, metrics_table)
+    pose_helper.save_table(reps_file, reps_table)
+    with open(summary_file, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    console.print(f"[green]{summary['reps']} reps[/green] in {video_input_file}")
+    console.print(f"Wrote {metrics_file}, {reps_file} and {summary_file}")
 
 
 @app.command()
@@ -222,6 +700,16 @@ def swings(
     body_part_seconds: float = typer.Option(
         0.5, help="Seconds to show body part labels"
     ),
+    shards: int = typer.Option(
+        1, help="Split YOLO capture across this many processes, 0 for one per core"
+    ),
+    batch_size: int = typer.Option(8, help="Frames per YOLO predict call"),
+    pose_stride: int = typer.Option(
+        1, help="Run pose every N frames, densifying where keypoints move fast"
+    ),
+    pose_motion_threshold: float = typer.Option(
+        0.02, help="Normalized keypoint motion between samples that densifies"
+    ),
 ):
     """Process a video file to detect and analyze swinging motions."""
     if video_input_file is None:
@@ -240,21 +728,58 @@ def swings(
     # Ensure output directory exists
     os.makedirs("output", exist_ok=True)
 
+    output_file = f"output/{base_filename}-processed.mp4"
+    render_video = force_video or not os.path.exists(output_file)
+    rendered = False
+
     # Check if YOLO data exists
-    yolo_data_file = f"output/{base_filename}-yolo.pickle.gz"
+    yolo_data_file = pose_cache_filename(base_filename)
+    legacy_yolo_data_file = f"output/{base_filename}-yolo.pickle.gz"
     if not force_yolo and os.path.exists(yolo_data_file):
         console.print(f"[green]Using existing YOLO data from[/green] {yolo_data_file}")
-        with open(yolo_data_file, "rb") as f:
-            yolo_data = pickle.load(f)
+        yolo_data = pose_cache.PoseCache(yolo_data_file)
+    elif not force_yolo and os.path.exists(legacy_yolo_data_file):
+        # Convert once, the pickle needs the same torch/ultralytics to load
+        console.print(
+            f"[green]Converting existing YOLO data from[/green] {legacy_yolo_data_file}"
+        )
+        with open(legacy_yolo_data_file, "rb") as f:
+            yolo_frames = pickle.load(f)
+        fps = video_fps(video_input_file)
+        pose_cache.save_yolo_frames(yolo_data_file, yolo_frames, fps)
+        yolo_data = pose_cache.PoseCache(yolo_data_file)
+    elif render_video and shards == 1 and not prompt:
+        # Cold cache and we want the video anyway, so only decode once.
+        # Rendering is sequential (the rep counter), so sharded capture
+        # still takes two passes.
+        console.print(
+            "[yellow]Generating new YOLO data and video output in one pass[/yellow]"
+        )
+        process_video_capturing_yolo(
+            video_input_file,
+            output_file,
+            label=label,
+            body_part_seconds=body_part_seconds,
+            batch_size=batch_size,
+            pose_stride=pose_stride,
+            pose_motion_threshold=pose_motion_threshold,
+        )
+        rendered = True
     else:
         console.print("[yellow]Generating new YOLO data[/yellow]")
-        yolo_data = process_video(video_input_file)
-        with open(yolo_data_file, "wb") as f:
-            pickle.dump(yolo_data, f)
+        process_video(
+            video_input_file,
+            shards=shards,
+            batch_size=batch_size,
+            pose_stride=pose_stride,
+            pose_motion_threshold=pose_motion_threshold,
+        )
+        yolo_data = pose_cache.PoseCache(yolo_data_file)
 
     # Process the video with YOLO data
-    output_file = f"output/{base_filename}-processed.mp4"
-    if not force_video and os.path.exists(output_file):
+    if rendered:
+        pass
+    elif not render_video:
         console.print(f"[green]Using existing video output[/green] {output_file}")
     else:
         if prompt: